@@ -19,6 +19,69 @@ from .Step import Step, WithStep
 
 dtLogger = simpleLog('DetailLogger')
 
+_TIME_RE = re.compile(r'^(\d+):(\d+):(\d+)$')  # 精确到秒的时间字符串
+
+
+# 子类定义时禁止覆盖的属性/方法及对应提示
+_FORBIDDEN_OVERRIDES = (
+    ('stepLayers', '禁止重新定义属性`stepLayers`！'),
+    ('caseLayer', '禁止在类属性上重新定义`caseLayer`，请通过重写`init`方法赋值！'),
+    ('__init__', '禁止重写`__init__`方法！'),
+    ('addStepLayer', '禁止重写`addStepLayer`方法！'),
+    ('getStepLayer', '禁止重写`getStepLayer`方法！'),
+    ('at_step', '禁止重写`at_step`方法！'),
+)
+
+_NOT_CASE_TAGS = frozenset({'setup', 'teardown'})
+
+
+class _CaseFile:
+    """延迟计算的`file`类属性：首次访问时由模块名构造Path，并缓存到子类
+
+    缓存只认 ``cls.__dict__`` 本类条目，避免后续子类沿MRO继承到父类的缓存路径。
+    """
+    def __get__(self, obj, cls):
+        file = cls.__dict__.get('_cachedFile')
+        if file is None:
+            file = Path(cls.__module__.replace('.', os.sep) + '.py')
+            cls._cachedFile = file
+        return file
+
+
+class _CaseDirname:
+    """延迟计算的`dirname`类属性：首次访问时取用例文件所在目录名，并缓存到子类
+
+    与 `_CaseFile` 相同，按本类 ``cls.__dict__`` 缓存，子类各自计算。
+    """
+    def __get__(self, obj, cls):
+        dirname = cls.__dict__.get('_cachedDirname')
+        if dirname is None:
+            dirname = cls.file.parent.name
+            cls._cachedDirname = dirname
+        return dirname
+
+
+def _runStepFunc(case, stepLayer, func, args, kwargs):
+    """执行被 `at_step` 装饰的步骤函数：记录步骤上下文，失败时统一转为 StepFailedError
+
+    模块级共享函数，各步骤的包装闭包只做转发，共用同一份执行逻辑。
+    """
+    with stepLayer.withStep():
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            case.caseLayer.dtLog.error(f'步骤失败：【{stepLayer.step}】，问题：【{e.__class__.__name__}: {e}】')
+            raise StepFailedError(str(stepLayer.step), f'执行步骤失败，问题：{e}') from e
+
+
+def _wrapTeardownFunc(stepStr, func):
+    """将teardown函数包装为带WithStep上下文的可调用对象"""
+    @functools.wraps(func)
+    def teardownStepFunc(*args, **kwargs):
+        with WithStep(stepStr):
+            return func(*args, **kwargs)
+    return teardownStepFunc
+
 
 class BaseCase(IBaseCase):
     """用例对象基类，必须重定义、属性，必须重写init、run方法。
@@ -47,13 +110,20 @@ class BaseCase(IBaseCase):
         case.run()
 
     """
+    # 固定实例属性走slots，'__dict__'保留给子类在init中自由赋值
+    __slots__ = ('_BaseCase__stepLayers', '_BaseCase__stepLayersView', '_BaseCase__stepNameSet',
+                 '_BaseCase__stepByStep',
+                 '_BaseCase__teardowns', '_BaseCase__teardownFunctionsView',
+                 '_BaseCase__teardownCounter', 'successMsg', 'failMsg', '__dict__')
+
     case_num = ''
     case_title = ''
     case_tag: Tuple[str, ...] = ()  # 用例标签，可选重写。特殊：setup、teardown 标签被视为非用例
 
     exe_case_id = 0  # 用例执行id
     caseLayer: CaseLayer = None
-    stepLayers: Tuple[StepLayer] = ()
+    file = _CaseFile()  # 用例所在.py文件路径，首次访问时计算
+    dirname = _CaseDirname()  # 用例所在目录名，首次访问时计算
     __all_case_num = set()
 
     @abstractmethod
@@ -66,36 +136,29 @@ class BaseCase(IBaseCase):
 
     def __init_subclass__(cls, **kwargs):
         """子类定义检查：必须定义类属性：case_num、case_title"""
-        cls.isCase = not any(map(lambda x: x in cls.case_tag, ('setup', 'teardown')))
-        file = Path(cls.__module__.replace('.', os.sep) + '.py')
-        cls.file = file
-        cls.dirname = file.parent.name
+        cls.isCase = not (_NOT_CASE_TAGS & frozenset(cls.case_tag))
         if not cls.case_num:
-            raise NotImplementedError(f"未定义类属性`case_num`！子类：`{cls.__name__}` in `{file}`")
+            raise NotImplementedError(f"未定义类属性`case_num`！子类：`{cls.__name__}` in `{cls.file}`")
         if not cls.case_title:
-            raise NotImplementedError(f"未定义类属性`case_title`！子类：`{cls.__name__}` in `{file}`")
+            raise NotImplementedError(f"未定义类属性`case_title`！子类：`{cls.__name__}` in `{cls.file}`")
         cls_dict = cls.__dict__
-        if 'stepLayers' in cls_dict:
-            raise PermissionError(f"禁止重新定义属性`stepLayers`！子类：`{cls.__name__}` in `{file}`")
-        if 'caseLayer' in cls_dict:
-            raise PermissionError(f"禁止在类属性上重新定义`caseLayer`，请通过重写`init`方法赋值！子类：`{cls.__name__}` in `{file}`")
-        if '__init__' in cls_dict:
-            raise PermissionError(f"禁止重写`__init__`方法！子类：`{cls.__name__}` in `{file}`")
-        if 'addStepLayer' in cls_dict:
-            raise PermissionError(f"禁止重写`addStepLayer`方法！子类：`{cls.__name__}` in `{file}`")
-        if 'getStepLayer' in cls_dict:
-            raise PermissionError(f"禁止重写`getStepLayer`方法！子类：`{cls.__name__}` in `{file}`")
-        if 'at_step' in cls_dict:
-            raise PermissionError(f"禁止重写`at_step`方法！子类：`{cls.__name__}` in `{file}`")
+        for name, message in _FORBIDDEN_OVERRIDES:
+            if name in cls_dict:
+                raise PermissionError(f"{message}子类：`{cls.__name__}` in `{cls.file}`")
         cls.case_full_name = f"TestCase: {cls.case_num}, {cls.case_title}"
         if cls.case_num not in ('setup', 'teardown'):
             if cls.case_num in BaseCase.__all_case_num:
-                raise AttributeError(f"类属性`case_num`存在重复值！子类：`{cls.__name__}` in `{file}`")
+                raise AttributeError(f"类属性`case_num`存在重复值！子类：`{cls.__name__}` in `{cls.file}`")
             BaseCase.__all_case_num.add(cls.case_num)
 
     def __init__(self):
-        self.__teardownFunctions = ()
-        self.lastTeardownStep = None
+        self.__stepLayers = []  # 内部步骤层列表，append为O(1)
+        self.__stepLayersView = None  # 缓存的不可变视图，添加步骤时失效
+        self.__stepNameSet = set()  # 步骤名索引，查重为O(1)
+        self.__stepByStep = {}  # Step -> StepLayer 索引，按步骤取层为O(1)（Step按字符串哈希，保持插入序）
+        self.__teardowns = []  # (步骤描述, 原始函数) 对列表，包装推迟到首次访问
+        self.__teardownFunctionsView = None
+        self.__teardownCounter = 0  # teardown步骤计数，标签由计数直接拼出
         self.successMsg = ''  # 执行成功后的附加信息
         self.failMsg = ''  # 执行失败后的附加信息
         self.init()
@@ -106,16 +169,10 @@ class BaseCase(IBaseCase):
         func = stepLayer.stepFunc
 
         @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            with stepLayer.withStep():
-                try:
-                    result = func(*args, **kwargs)
-                    return result
-                except Exception as e:
-                    self.caseLayer.dtLog.error(f'步骤失败：【{stepLayer.step}】，问题：【{e.__class__.__name__}: {e}】')
-                    raise StepFailedError(str(stepLayer.step), f'执行步骤失败，问题：{e}') from e
-
-        stepLayer.stepFunc = wrapper
+        def stepFunc(*args, **kwargs):
+            return _runStepFunc(self, stepLayer, func, args, kwargs)
+
+        stepLayer.stepFunc = stepFunc
         stepLayer.step.logger = dtLogger
         return stepLayer
 
@@ -146,6 +203,13 @@ class BaseCase(IBaseCase):
                                    frequency=frequency)
         return self.caseLayer
 
+    @property
+    def stepLayers(self) -> Tuple[StepLayer, ...]:
+        """所有步骤层对象（不可变视图）"""
+        if self.__stepLayersView is None:
+            self.__stepLayersView = tuple(self.__stepLayers)
+        return self.__stepLayersView
+
     @property
     def teardownFunctions(self):
         """获取teardown函数列表
@@ -153,7 +217,10 @@ class BaseCase(IBaseCase):
         :return: teardown函数列表
         :rtype: tuple[function]
         """
-        return self.__teardownFunctions
+        if self.__teardownFunctionsView is None:
+            self.__teardownFunctionsView = tuple(_wrapTeardownFunc(stepStr, func)
+                                                 for stepStr, func in self.__teardowns)
+        return self.__teardownFunctionsView
 
     def addTeardown(self, func, description=''):
         """添加teardown函数
@@ -162,17 +229,22 @@ class BaseCase(IBaseCase):
         :param description: 步骤描述
         :type func: function
         """
-        if not self.lastTeardownStep:
-            self.lastTeardownStep = Step(description)
-        else:
-            self.lastTeardownStep = self.lastTeardownStep.nextStep(description)
-        nowStep = str(self.lastTeardownStep)
+        self.__teardownCounter += 1
+        self.__teardowns.append((f'step{self.__teardownCounter}: {description.strip()}', func))
+        self.__teardownFunctionsView = None
 
-        @functools.wraps(func)
-        def teardownStepFunc(*args, **kwargs):
-            with WithStep(nowStep):
-                return func(*args, **kwargs)
-        self.__teardownFunctions += (teardownStepFunc,)
+    @property
+    def lastTeardownStep(self):
+        """最后一个teardown对应的Step对象，按需由标签字符串解析构建"""
+        if not self.__teardowns:
+            return None
+        return Step(self.__teardowns[-1][0], parseFromMsg=True)
+
+    def runTeardowns(self):
+        """按添加顺序依次执行所有teardown函数，直接进入WithStep上下文、不构造包装闭包"""
+        for stepStr, func in self.__teardowns:
+            with WithStep(stepStr):
+                func()
 
     def __call__(self):
         return self.run()
@@ -194,20 +266,20 @@ class BaseCase(IBaseCase):
         if not self.caseLayer:
             self.setCaseLayer()
         step = step if isinstance(step, Step) else Step(step, parseFromMsg=True)
-        if step.stepName in [sLayer.stepName for sLayer in self.stepLayers]:
+        if step.stepName in self.__stepNameSet:
             raise ValueError(f'步骤名重复：{step.stepName}')
         stepLayer = StepLayer(step, stepFunc, self.caseLayer, locked=locked, timeout=timeout, frequency=frequency,
                             autoType=autoType, failContinue=failContinue)
         stepLayer = self.at_step(stepLayer)
-        self.stepLayers += (stepLayer,)
+        self.__stepNameSet.add(step.stepName)
+        self.__stepLayers.append(stepLayer)
+        self.__stepByStep[step] = stepLayer
+        self.__stepLayersView = None
         return stepLayer
 
     def getStepLayer(self, step: Step):
         """获取步骤层"""
-        for stepLayer in self.stepLayers:
-            if stepLayer.step == step:
-                return stepLayer
-        return None
+        return self.__stepByStep.get(step)
 
     def duringDoing(self, doFunc: Callable, days: Union[int, float], atTime: Union[str, datetime.time]):
         """持续几天，每天定时执行一个函数
@@ -218,21 +290,22 @@ class BaseCase(IBaseCase):
         :return:
         """
         if isinstance(atTime, str):
-            match = re.match(r'^(\d+):(\d+):(\d+)$', atTime)
+            match = _TIME_RE.match(atTime)
             if not match:
                 raise TypeError(f'时间格式不正确（须精确到秒）：{atTime}')
-            targetTime = datetime.datetime(1, 1, 2, int(match.group(1)), int(match.group(2)), int(match.group(3)))
+            targetTime = datetime.time(int(match.group(1)), int(match.group(2)), int(match.group(3)))
         else:
-            targetTime = datetime.datetime(1, 1, 2).replace(hour=atTime.hour, minute=atTime.minute, second=atTime.second)
-        closeTo = targetTime - datetime.timedelta(minutes=1)
+            targetTime = datetime.time(atTime.hour, atTime.minute, atTime.second)
         start = datetime.datetime.now()
-        frequency = 45
-        while (now := datetime.datetime.now()) - start < datetime.timedelta(days=days):
-            if now.hour == targetTime.hour and now.minute == targetTime.minute and now.second == targetTime.second:
-                self.caseLayer.dtLog.info(f'到达指定时间 {atTime}，开始定时执行')
-                doFunc()
-                frequency = 45
-            elif now.hour == closeTo.hour and now.minute == closeTo.minute:
-                frequency = 0.6
-            time.sleep(frequency)
+        deadline = start + datetime.timedelta(days=days)
+        nextFire = datetime.datetime.combine(start.date(), targetTime)
+        if nextFire <= start:
+            nextFire += datetime.timedelta(days=1)
+        while nextFire <= deadline:  # 直接睡到下一次触发时刻，不轮询
+            delay = (nextFire - datetime.datetime.now()).total_seconds()
+            if delay > 0:
+                time.sleep(delay)
+            self.caseLayer.dtLog.info(f'到达指定时间 {atTime}，开始定时执行')
+            doFunc()
+            nextFire += datetime.timedelta(days=1)
 
@@ -44,6 +44,7 @@ class RunningStatus(Enum):
 
 class IBaseCase(ABC):
     """用例对象基类接口，仅用于定义基本接口"""
+    __slots__ = ()
     case_num: str         # 用例编号
     case_title: str       # 用例标题
     case_full_name: str   # 标准格式用例全称（含编号、标题，及前缀中缀后缀的格式化名称）
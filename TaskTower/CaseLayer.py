@@ -7,28 +7,84 @@
 # ========================================
 from __future__ import annotations
 
+import asyncio
 import datetime
+import functools
 import importlib
+import os
 import re
+import sys
 import threading
 import time
 import traceback
 import warnings
-from pathlib import Path
-from logging import Logger
+from logging import INFO, Logger
 from types import ModuleType
 from typing import List, Tuple, Union, Optional, Callable, Dict, Any
-from xml.dom import minidom
 from lxml import etree
 
 from .BaseType import *
 
+_UNCHANGED = object()  # 哨兵：_setRunning 调用中表示不修改 isPass
+
+_CASE_TITLE_RE = re.compile(r"^(TestCase[:：]\s*)?\s*([\w\s.:-]*)\s*[,:，：]\s*", re.ASCII)  # 用例全称中标题前的前缀
+
+
+_WARNED_CASES = set()  # 已发出过层级缺失警告的用例编号，同一用例只警告一次
+
+_XML_BRACKET_TR = str.maketrans({'<': '‹', '>': '›'})  # 描述中尖括号转义表，一次扫描完成替换
+
+
+def _logInfo(logger, msgFactory):
+    """INFO级别放行时才构造并记录消息，日志被丢弃时省去字符串拼接开销
+
+    :param logger: 日志对象（可能为自定义对象，无 isEnabledFor 时视为放行）
+    :param msgFactory: 无参可调用对象，返回消息文本
+    """
+    isEnabledFor = getattr(logger, 'isEnabledFor', None)
+    if isEnabledFor is None or isEnabledFor(INFO):
+        logger.info(msgFactory())
+
+
+@functools.lru_cache(maxsize=128)
+def _splitTags(tags: str) -> frozenset:
+    """将逗号分隔的tag字符串解析为小写frozenset。同一运行参数反复解析时直接命中缓存。"""
+    return frozenset(t.strip().lower() for t in tags.split(',') if t.strip())
+
+# 停止类异常的统一处理表：异常类型 -> (终态, 日志级别, 描述, 是否重新抛出)
+_STOP_HANDLERS = {
+    CaseStopCanceled: (RunningStatus.Canceled, 'warning', '已取消', False),
+    CaseStopExit: (RunningStatus.Killed, 'error', '退出执行！', True),
+}
+
+# 终态集合：用例进入这些状态后通知所有等待中的层级
+_TERMINAL_STATES = frozenset({RunningStatus.Finished, RunningStatus.Error, RunningStatus.Skipped,
+                              RunningStatus.Timeout, RunningStatus.Canceled, RunningStatus.Killed})
+
 
 class CaseLayer:
     """一个用例函数层级对象，储存关于用例函数的一些数据"""
+    # 固定实例属性走slots，降低单实例内存并加速属性访问
+    __slots__ = (
+        '_CaseLayer__cachedFull', '_CaseLayer__cachedSimple',
+        '_CaseLayer__caseFunc', '_CaseLayer__caseFullName', '_CaseLayer__caseNum', '_CaseLayer__caseTitle',
+        '_CaseLayer__caseRunFunc', '_CaseLayer__module',
+        '_CaseLayer__timeout', '_CaseLayer__frequency', '_CaseLayer__level', '_CaseLayer__skip',
+        '_CaseLayer__flag', '_CaseLayer__toLog', '_CaseLayer__dtLog', '_CaseLayer__loop',
+        '_CaseLayer__order', '_CaseLayer__running', '_CaseLayer__isPass', '_CaseLayer__dirName',
+        '_CaseLayer__locked', '_CaseLayer__run_count',
+        '_CaseLayer__launchTime', '_CaseLayer__beginTime',
+        '_CaseLayer__launchTime_mono', '_CaseLayer__beginTime_mono',
+        '_CaseLayer__duration', '_CaseLayer__totalTime', '_CaseLayer__totalTime_count',
+        '_CaseLayer__runningStep', '_CaseLayer__steps', '_CaseLayer__stepsView', '_CaseLayer__step_ids',
+        '_CaseLayer__DataSpace', '_CaseLayer__featureLayer', '_CaseLayer__projectLayer', '_CaseLayer__tagSet',
+        '_CaseLayer__CaseStatus', '_CaseLayer__cancelEvent', '_CaseLayer__loopMsgs', 'error_count',
+    )
     __count = 0  # 实例化总数
     lock = threading.Lock()
     '''用例的线程锁'''
+    _fallbackCondition = threading.Condition()
+    '''无根项目时使用的状态通知条件变量'''
     def __init__(self, caseFunc, module=None, *, featureLayer=None, projectLayer=None, level=Enums.Level_feature,
                  flag=None, dirName=None, locked=True, skip=False, timeout=0, frequency=15):
         """用例函数层级，储存运行状态、通过情况等。可添加步骤层级，但无论有无都不会有任何影响，应在用例函数内部实现stepLayer调用。
@@ -45,12 +101,20 @@ class CaseLayer:
         :param int | float timeout: 在执行用例前检查其他用例状态、直到可运行的超时时间。（-1：永远，0：检查一次，>0：超时时间，秒）
         :param int | float frequency: 检查频率，秒
         """
+        self.__cachedFull = None  # 缓存的完整描述字符串，状态变更时失效
+        self.__cachedSimple = None  # 缓存的简单描述字符串，状态变更时失效
+        self.__tagSet = None  # 缓存的tag集合，dirName变更时失效
         self.__caseFunc = caseFunc
-        try:
-            _ = self.caseFullName
+        try:  # 用例身份构造后不变，解析一次并缓存，省去每次访问的isinstance/hasattr链
+            self.__caseFullName = self._parseCaseFullName()
         except Exception:
             raise TypeError('用例函数对象只能为：函数对象/方法对象/IBaseCase！')
+        self.__caseNum = self._parseCaseNum()
+        self.__caseTitle = self._parseCaseTitle()
         self.module = module
+        if self.__module is None:
+            # 用例函数来自已导入的模块，直接查 sys.modules，避免后续每次访问走 import_module
+            self.__module = sys.modules.get(getattr(caseFunc, '__module__', None))
         self.timeout = timeout
         self.level = level
         self.skip = skip
@@ -60,8 +124,10 @@ class CaseLayer:
         self.frequency = frequency
         self.loop = 1
         self.error_count = 0
-        if not isinstance(caseFunc, Callable):
+        if not callable(caseFunc):
             raise TypeError('`caseFunc`必须为可调用对象！')
+        # 解析一次执行函数并缓存：用例类对象取其run方法，其余可调用对象直接使用
+        self.__caseRunFunc = caseFunc.run if isinstance(caseFunc, IBaseCase) else caseFunc
         CaseLayer.__count += 1
         self.__order = 1
         self.__running = RunningStatus.UnRun
@@ -71,34 +137,35 @@ class CaseLayer:
         self.__run_count = 0
         self.__launchTime = None  # 启动执行的时间点
         self.__beginTime = None  # 用例实际开始执行的时间电（和上面的差值就是浪费的等待时间）
+        self.__launchTime_mono = None  # 启动时间对应的单调时钟，供运行中计算耗时
+        self.__beginTime_mono = None  # 开始时间对应的单调时钟，供运行中计算耗时
         self.__duration = datetime.timedelta()  # 用例用时/耗时
         self.__totalTime = datetime.timedelta()  # 启动到用例实际结束的总耗时（和上面的差值就是浪费的等待时间）
         self.__totalTime_count = datetime.timedelta()  # 循环执行时，启动到用例实际结束的总耗时合计
-        self.__steps: Tuple[StepLayer, ...] = ()
+        self.__runningStep: Optional[StepLayer] = None  # 当前运行中的步骤，由步骤状态变更时维护
+        self.__steps: List[StepLayer] = []  # 内部步骤层列表，append为O(1)
+        self.__stepsView = None  # 缓存的不可变视图，添加步骤时失效
+        self.__step_ids = set()  # 已添加步骤层的id索引，查重为O(1)
         self.__DataSpace = {}  # 数据空间，用于存储任意数据
-        if all((featureLayer, projectLayer)) and featureLayer.projectLayer is not projectLayer:
+        if featureLayer and projectLayer and featureLayer.projectLayer is not projectLayer:
             raise ValueError('父级FeatureLayer的根项目与传入的根项目不一致！')
-        if self.level == Enums.Level_feature and featureLayer is None and not baseConfig.closeWarning:
-            warnings.warn(f'feature级用例层必须有父级FeatureLayer！你应该在执行前及时赋值！用例：{self.caseNum}', RuntimeWarning, stacklevel=2)
-        if self.level == Enums.Level_project and projectLayer is None and not baseConfig.closeWarning:
-            warnings.warn(f'project级用例层必须有根ProjectLayer！你应该在执行前及时赋值！用例：{self.caseNum}', RuntimeWarning, stacklevel=2)
+        if not baseConfig.closeWarning and self.caseNum not in _WARNED_CASES:
+            if self.level == Enums.Level_feature and featureLayer is None:
+                _WARNED_CASES.add(self.caseNum)
+                warnings.warn(f'feature级用例层必须有父级FeatureLayer！你应该在执行前及时赋值！用例：{self.caseNum}', RuntimeWarning, stacklevel=2)
+            elif self.level == Enums.Level_project and projectLayer is None:
+                _WARNED_CASES.add(self.caseNum)
+                warnings.warn(f'project级用例层必须有根ProjectLayer！你应该在执行前及时赋值！用例：{self.caseNum}', RuntimeWarning, stacklevel=2)
         self.__featureLayer = featureLayer
         self.__projectLayer = projectLayer
         if self.featureLayer is not None:
             self.__dirName = self.featureLayer.dirName
+            self.__tagSet = None
             if self not in self.featureLayer.caseLayerList:
                 self.featureLayer.addCaseLayer(self)
-        self.__CaseStatus = OneCaseStatus(
-            caseNum=self.caseNum,
-            caseTitle=self.caseTitle,
-            level=self.level,
-            featureName=self.dirName,
-            running=self.running,
-            isPass=self.isPass,
-            duration=self.duration,
-            totalTime=self.totalTime,
-            runCount=self.run_count,
-        )
+        self.__cancelEvent = threading.Event()  # 取消请求标记，等待中的用例被唤醒后检查
+        self.__loopMsgs: List[OneCaseLoopMsg] = []  # 各循环执行信息，内部列表append为O(1)，查询状态时转为元组
+        self.__CaseStatus = None  # OneCaseStatus对象延迟到首次查询状态时构建
 
     def __str__(self): return self.descriptionFull
     def __repr__(self): return f'CaseLayer(caseFunc={self.caseFunc.__name__}{f", module={self.module.__name__}" if self.module else ""})'
@@ -106,24 +173,33 @@ class CaseLayer:
     @property
     def descriptionDetails(self):
         """最详细的自我描述"""
-        if not self.steps:
-            return self.descriptionFull
-        xml_str = self.descriptionFull
-        tree: etree._ElementTree = etree.ElementTree(etree.fromstring(xml_str))
-        root: etree._Element = tree.getroot()
-        stepsEle: etree._Element = root.find('steps')
+        return etree.tostring(self._descriptionDetailsElement(), pretty_print=True, encoding='unicode')
+
+    def _descriptionDetailsElement(self) -> etree._Element:
+        """构建最详细自我描述的 _Element 树，步骤层直接以元素拼接、不经字符串往返"""
+        root, stepsEle = self._buildFullTree()
         for step in self.steps:
-            step_tree: etree._ElementTree = etree.ElementTree(etree.fromstring(step.descriptionFull))
-            step_root: etree._Element = step_tree.getroot()
+            step_root = step._descriptionFullElement()
             step_root.set('stepName', str(step.stepName))
             stepsEle.append(step_root)
-        new_xml = minidom.parseString(etree.tostring(tree.getroot()).replace(b'\n',b'').replace(b'\t',b'')).toprettyxml()
-        new_xml: str = new_xml.replace('<?xml version="1.0" ?>', '')
-        return new_xml
+        return root
 
     @property
     def descriptionFull(self):
-        """完整自我描述"""
+        """完整自我描述（按状态缓存，状态未变时直接返回缓存字符串）
+
+        运行中 duration 随时间增长，此期间绕过缓存实时渲染，避免冻结首次取值。
+        """
+        if self.running == RunningStatus.Running:
+            root, _ = self._buildFullTree()
+            return etree.tostring(root, pretty_print=True, encoding='unicode')
+        if self.__cachedFull is None:
+            root, _ = self._buildFullTree()
+            self.__cachedFull = etree.tostring(root, pretty_print=True, encoding='unicode')
+        return self.__cachedFull
+
+    def _buildFullTree(self) -> Tuple[etree._Element, etree._Element]:
+        """构建完整自我描述的 _Element 树，返回 (根节点, steps子节点)"""
         root = etree.Element('CaseLayer')  # 根节点
         etree.SubElement(root, 'id', attrib={'value': str(id(self))})
         etree.SubElement(root, 'caseNum', attrib={'value': str(self.caseNum)})
@@ -138,27 +214,84 @@ class CaseLayer:
         etree.SubElement(root, 'order', attrib={'value': str(self.order)})
         etree.SubElement(root, 'loop', attrib={'value': str(self.loop)})
         etree.SubElement(root, 'run_count', attrib={'value': str(self.run_count)})
-        etree.SubElement(root, 'caseFunc', attrib={'value': str(self.caseFunc).replace('<', '‹').replace('>', '›')})
-        etree.SubElement(root, 'module', attrib={'value': str(self.module).replace('<', '‹').replace('>', '›')})
-        etree.SubElement(root, 'caseFullName', attrib={'value': str(self.caseFullName).replace('<', '‹').replace('>', '›')})
-        _ = etree.SubElement(root, 'steps', attrib={'count': str(len(self.steps))})
-        tree = etree.ElementTree(root)
-        xml_str = minidom.parseString(etree.tostring(tree.getroot())).toprettyxml()
-        xml_str: str = xml_str.replace('<?xml version="1.0" ?>', '')
-        return xml_str
+        etree.SubElement(root, 'caseFunc', attrib={'value': str(self.caseFunc).translate(_XML_BRACKET_TR)})
+        etree.SubElement(root, 'module', attrib={'value': str(self.module).translate(_XML_BRACKET_TR)})
+        etree.SubElement(root, 'caseFullName', attrib={'value': str(self.caseFullName).translate(_XML_BRACKET_TR)})
+        stepsEle = etree.SubElement(root, 'steps', attrib={'count': str(len(self.steps))})
+        return root, stepsEle
 
     @property
     def descriptionSimple(self):
-        """简单自我描述"""
-        description = f'<CaseLayer id="{id(self)}" caseNum="{self.caseNum}" level="{self.level}" flag="{self.flag}"/>'
-        return description
+        """简单自我描述（按状态缓存）"""
+        if self.__cachedSimple is None:
+            self.__cachedSimple = f'<CaseLayer id="{id(self)}" caseNum="{self.caseNum}" level="{self.level}" flag="{self.flag}"/>'
+        return self.__cachedSimple
+
+    def _invalidateDescription(self):
+        """令缓存的描述字符串失效"""
+        self.__cachedFull = self.__cachedSimple = None
+
+    def _bumpFeatureRev(self):
+        """向父级传播结构变更，使其缓存的描述/统计失效
+
+        项目级setup/teardown用例没有父级功能分类，改为直接通知所属项目。
+        """
+        featureLayer = getattr(self, '_CaseLayer__featureLayer', None)  # init期间可能尚未赋值
+        if featureLayer is not None:
+            featureLayer._bumpRev()
+            return
+        projectLayer = getattr(self, '_CaseLayer__projectLayer', None)
+        if projectLayer is not None:
+            projectLayer._bumpShapeRev()
+
+    def _setRunning(self, running: RunningStatus, isPass=_UNCHANGED):
+        """集中修改运行/通过状态，同时令缓存的描述失效；到达终态时唤醒等待中的层级"""
+        prev = self.__running
+        self.__running = running
+        if running != prev:
+            if running == RunningStatus.Running:
+                self._notifyRunningChanged(True)
+            elif prev == RunningStatus.Running:
+                self._notifyRunningChanged(False)
+        if isPass is not _UNCHANGED:
+            self.__isPass = isPass
+        self.__cachedFull = self.__cachedSimple = None
+        if running in _TERMINAL_STATES:
+            condition = self._stateCondition()
+            with condition:
+                condition.notify_all()
+
+    def _notifyRunningChanged(self, started: bool):
+        """用例进入/离开Running状态时维护项目级运行计数（无根项目时跳过）"""
+        try:
+            projectLayer = self.projectLayer
+        except AttributeError:
+            return
+        if projectLayer is not None:
+            projectLayer._caseRunningChanged(started)
+
+    def _stateCondition(self) -> threading.Condition:
+        """状态变更通知的条件变量：优先取所属项目的，无根项目时退回类级共享的"""
+        try:
+            return self.projectLayer._stateCondition
+        except AttributeError:
+            return CaseLayer._fallbackCondition
+
+    def _descriptionSimpleElement(self) -> etree._Element:
+        """简单自我描述的 _Element 形式，供上层直接拼接"""
+        return etree.Element('CaseLayer', attrib={
+            'id': str(id(self)), 'caseNum': str(self.caseNum), 'level': str(self.level), 'flag': str(self.flag)})
 
     @property
     def id(self): return id(self)
 
     @property
     def caseNum(self) -> str:
-        """用例编号"""
+        """用例编号（init时解析缓存）"""
+        return self.__caseNum
+
+    def _parseCaseNum(self) -> str:
+        """解析用例编号"""
         # 用例类对象
         if isinstance(self.caseFunc, IBaseCase):
             return self.caseFunc.case_num
@@ -179,7 +312,11 @@ class CaseLayer:
 
     @property
     def caseFullName(self):
-        """用例完整名称（含编号、标题，及前缀中缀后缀的格式化名称，如：`TestCase: case_001: 正常登录`）"""
+        """用例完整名称（含编号、标题，及前缀中缀后缀的格式化名称，如：`TestCase: case_001: 正常登录`）（init时解析缓存）"""
+        return self.__caseFullName
+
+    def _parseCaseFullName(self) -> str:
+        """解析用例完整名称"""
         # 用例类对象
         if isinstance(self.caseFunc, IBaseCase):
             return self.caseFunc.case_full_name
@@ -191,15 +328,18 @@ class CaseLayer:
 
     @property
     def caseTitle(self):
-        """用例标题"""
+        """用例标题（init时解析缓存）"""
+        return self.__caseTitle
+
+    def _parseCaseTitle(self) -> str:
+        """解析用例标题"""
         # 用例类对象
         if isinstance(self.caseFunc, IBaseCase):
             return self.caseFunc.case_title
         # 用例类对象.run
         elif hasattr(self.caseFunc, '__self__') and isinstance(self.caseFunc.__self__, IBaseCase):
             return self.caseFunc.__self__.case_title
-        fullName = ((self.caseFunc.doc if hasattr(self.caseFunc, 'doc') else self.caseFunc.__doc__) or '').strip()
-        return re.sub(r"^(TestCase[:：]\s*)?\s*([\w\s.:-]*)\s*[,:，：]\s*", '', fullName, flags=re.ASCII)
+        return _CASE_TITLE_RE.sub('', self.__caseFullName)
 
     @property
     def tag(self) -> Tuple[str, ...]:
@@ -223,7 +363,7 @@ class CaseLayer:
         """用例所在模块对象"""
         if not self.__module:
             try:
-                return importlib.import_module(self.caseFunc.__module__)
+                self.__module = importlib.import_module(self.caseFunc.__module__)
             except:
                 pass
         return self.__module  # 用例`.py`文件对象（模块）
@@ -291,19 +431,18 @@ class CaseLayer:
 
     @property
     def caseRunFunc(self):
-        """用例执行函数"""
-        # 用例类对象
-        if isinstance(self.caseFunc, IBaseCase):
-            return self.caseFunc.run
-        # 用例类对象.run / 用例函数对象
-        elif isinstance(self.caseFunc, Callable):
-            return self.caseFunc
-        raise TypeError('用例对象类型错误，不可执行')
+        """用例执行函数（init时已解析并缓存）"""
+        return self.__caseRunFunc
 
     @property
     def dirName(self) -> str: return self.__dirName  # 所在目录名（功能分类名）
+
     @dirName.setter
-    def dirName(self, dirName: str): self.__dirName = dirName
+    def dirName(self, dirName: str):
+        self.__dirName = dirName
+        self.__tagSet = None  # 默认tag含目录名，目录变更后重建
+        self._invalidateDescription()  # tag参与完整描述渲染
+        self._bumpFeatureRev()  # tag筛选的统计缓存按_rev失效
     @property
     def level(self): return self.__level  # 用例级别（project/feature）
 
@@ -313,6 +452,8 @@ class CaseLayer:
         if level not in (Enums.Level_project, Enums.Level_feature):
             raise ValueError(f'`level` only can be `project` or `feature`, but not `{level}`!')
         self.__level = level
+        self._invalidateDescription()
+        self._bumpFeatureRev()
 
     @property
     def order(self):
@@ -325,6 +466,8 @@ class CaseLayer:
         if not isinstance(order, (int, float)):
             raise TypeError('设置次序值必须为 int/float！')
         self.__order = order
+        self._invalidateDescription()
+        self._bumpFeatureRev()
 
     @property
     def run_count(self) -> int:
@@ -344,6 +487,7 @@ class CaseLayer:
         if loop < 1:
             raise ValueError(f'设置次数最小只能为1，而非 {loop}')
         self.__loop = loop
+        self._invalidateDescription()
 
     @property
     def flag(self): return self.__flag  # 特殊标记（setup/teardown）
@@ -351,11 +495,17 @@ class CaseLayer:
     @flag.setter
     def flag(self, flag: str):
         self.__flag = flag
+        self._invalidateDescription()
+        self._bumpFeatureRev()
         if self.flag in ('setup', 'teardown'):
             self.skip = False
 
     @property
-    def steps(self): return self.__steps  # 下级步骤层级对象
+    def steps(self) -> Tuple[StepLayer, ...]:
+        """下级步骤层级对象（不可变视图）"""
+        if self.__stepsView is None:
+            self.__stepsView = tuple(self.__steps)
+        return self.__stepsView
     @property
     def running(self) -> RunningStatus: return self.__running
     @property
@@ -373,6 +523,8 @@ class CaseLayer:
         if not isinstance(skip, bool):
             raise ValueError('"skip" must be bool!')
         self.__skip = skip
+        self._invalidateDescription()
+        self._bumpFeatureRev()
 
     @property
     def timeout(self): return self.__timeout  # 检查其他用例状态超时时间
@@ -403,7 +555,7 @@ class CaseLayer:
         - 若已结束：执行用例的总耗时
         """
         if self.running == RunningStatus.Running:
-            return datetime.datetime.now() - self.beginTime
+            return datetime.timedelta(seconds=time.monotonic() - self.__beginTime_mono)
         return self.__duration
 
     @property
@@ -415,7 +567,7 @@ class CaseLayer:
         - 若已结束[正常+异常]/超时：执行完毕的总耗时
         """
         if self.running in (RunningStatus.Waiting, RunningStatus.Running):
-            return datetime.datetime.now() - self.launchTime
+            return datetime.timedelta(seconds=time.monotonic() - self.__launchTime_mono)
         return self.__totalTime
 
     @property
@@ -423,12 +575,21 @@ class CaseLayer:
 
     @property
     def CaseStatus(self) -> OneCaseStatus:
-        """获取当前用例状态"""
+        """获取当前用例状态（状态对象首次查询时才构建，未被查询的用例不分配）"""
+        if self.__CaseStatus is None:
+            self.__CaseStatus = OneCaseStatus(
+                caseNum=self.caseNum,
+                caseTitle=self.caseTitle,
+                level=self.level,
+                featureName=self.dirName,
+            )
         self.__CaseStatus.isPass = self.isPass
         self.__CaseStatus.duration = self.duration
         self.__CaseStatus.totalTime = self.totalTime
         self.__CaseStatus.running = self.running
         self.__CaseStatus.runCount = self.run_count
+        if len(self.__CaseStatus.loopMsgs) != len(self.__loopMsgs):
+            self.__CaseStatus.loopMsgs = tuple(self.__loopMsgs)
         return self.__CaseStatus
 
     def setDataSpace(self, key, value):
@@ -440,11 +601,12 @@ class CaseLayer:
         return self.__DataSpace.get(key)
 
     def getRunningStep(self) -> Optional[StepLayer]:
-        """获取正在执行的步骤"""
-        for step in self.steps:
-            if step.running == RunningStatus.Running:
-                return step
-        return None
+        """获取正在执行的步骤（由步骤状态变更时维护，O(1)）"""
+        return self.__runningStep
+
+    def _setRunningStep(self, stepLayer: Optional[StepLayer]):
+        """步骤状态变更时维护当前运行中的步骤"""
+        self.__runningStep = stepLayer
 
     def getStepLayerByID(self, stepLayerID: int):
         """根据步骤层ID获取步骤层对象"""
@@ -458,17 +620,24 @@ class CaseLayer:
 
     def addStepLayer(self, *stepLayer: StepLayer):
         """添加步骤层对象"""
-        if not all(map(lambda c: isinstance(c, StepLayer), stepLayer)):
-            self.toLog.error(f'本函数只能添加 StepLayer！输入值：{stepLayer}')
-            raise TypeError('本函数只能添加 StepLayer！')
-        if not all(map(lambda c: c.caseLayer is self or c.caseLayer is None, stepLayer)):
-            self.toLog.error(f'只能添加本用例下的 StepLayer！')
-            raise TypeError('只能添加本用例下的 StepLayer！')
-        for _s in stepLayer:
+        for _s in stepLayer:  # 校验与插入合并为单次遍历
+            if not isinstance(_s, StepLayer):
+                self.toLog.error(f'本函数只能添加 StepLayer！输入值：{_s!r}')
+                raise TypeError('本函数只能添加 StepLayer！')
+            if _s.caseLayer is not None and _s.caseLayer is not self:
+                self.toLog.error(f'只能添加本用例下的 StepLayer！')
+                raise TypeError('只能添加本用例下的 StepLayer！')
             if _s.caseLayer is None:
                 _s.caseLayer = self
-            if _s not in self.steps:
-                self.__steps += (_s,)
+            if id(_s) not in self.__step_ids:
+                self.__step_ids.add(id(_s))
+                self.__steps.append(_s)
+                self.__stepsView = None
+                self._invalidateDescription()  # 步骤数参与完整描述渲染
+
+    def _containsStep(self, stepLayer: StepLayer) -> bool:
+        """判断步骤层是否已添加到本用例（按对象id判断，O(1)）"""
+        return id(stepLayer) in self.__step_ids
 
     def getAttr(self, attrName: str):
         """从本用例载入后的对象中获取指定属性"""
@@ -488,20 +657,15 @@ class CaseLayer:
         :return: 是否应跑
         """
         def tagRunMode(_tags='', _untags=''):
-            """通过tag方式判断是否应运行"""
+            """通过tag方式判断是否应运行（集合交集判断，C层一次完成）"""
             if self.flag in ('setup', 'teardown'):
                 return True
-            self_tag = self.tag
-            if _untags:
-                for _untag in _untags.split(","):
-                    if _untag.lower() in self_tag:
-                        return False
+            if self.__tagSet is None:
+                self.__tagSet = frozenset(self.tag)
+            if _untags and _splitTags(_untags) & self.__tagSet:
+                return False
             # 如果 taglist 中包含任意一个 tag, 则返回True
-            if _tags:
-                for _tag in _tags.split(","):
-                    if _tag.lower() in self_tag:
-                        return True
-            return False
+            return bool(_tags) and bool(_splitTags(_tags) & self.__tagSet)
 
         if tags:
             return tagRunMode(tags, untags)
@@ -535,15 +699,16 @@ class CaseLayer:
         :param projectLayer: 指定的projectLayer
         :return: 本用例是否将执行
         """
-        runningFuncLayers = [caseLayer for proLayer in projectLayer for caseLayer in proLayer.getRunningCaseLayers()]
-        if not runningFuncLayers:  # 1. 若无其他运行用例：本用例将运行
+        # 1. 若无其他运行用例：本用例将运行（先查O(1)运行计数，非零才遍历层级树确认）
+        if not any(proLayer.anyRunning() and proLayer.hasRunningCases() for proLayer in projectLayer):
             return True
         # 2. 若有其他运行用例：读取自身 `locked`
         if self.locked:  # 2.1. 若自身锁定：继续等待
             return False
         # 2.2. 若自身不锁定 -> 读取该运行中的用例的 `locked`
-        # 2.2.1. 若任一用例锁定，或自身无步骤：继续等待
-        if not self.steps or any([caseLayer.locked for caseLayer in runningFuncLayers]):
+        # 2.2.1. 若任一用例锁定，或自身无步骤：继续等待（惰性遍历，遇到锁定用例立即停止）
+        if not self.steps or any(caseLayer.locked for proLayer in projectLayer
+                                 for caseLayer in proLayer.iterRunningCaseLayers()):
             return False
         # 2.2.2. 若所有用例非独立执行：执行本用例
         return True
@@ -571,55 +736,60 @@ class CaseLayer:
 
         :return: 是否通过
         """
-        self.__running = RunningStatus.UnRun
-        self.__isPass = None
+        self._setRunning(RunningStatus.UnRun, None)
         # 首先，判断是否应该执行
         if not self.shouldRun():
             if self.projectLayer.runBy == Enums.RunBy_skip:
-                self.__running = RunningStatus.Skipped
+                self._setRunning(RunningStatus.Skipped)
             return self.isPass
 
         # 即将执行，预先判断其他用例运行情况
-        self.__running = RunningStatus.Waiting
+        self._setRunning(RunningStatus.Waiting)
         self.__launchTime = datetime.datetime.now()
+        self.__launchTime_mono = time.monotonic()
         if self.timeout == 0:
             if not self.willRun(self.projectLayer):
-                self.__running = RunningStatus.Timeout
-                self.__totalTime = datetime.datetime.now() - self.launchTime
-                self.__totalTime_count += self.__totalTime
+                self._finalizeWait(RunningStatus.Timeout)
                 msg = f'用例执行失败，存在其他执行中的用例！本用例：{self.caseNum}'
                 self.toLog.error(msg)
                 return self.isPass
         else:
             willRun = False
-            start = time.time()
-            usetime = time.time() - start
+            start = time.monotonic()
+            usetime = 0.0
+            # 热循环前一次性读取属性、拼好固定的等待日志，循环内只用局部变量
+            timeout = self.timeout
+            frequency = self.frequency
+            toLog = self.toLog
+            projectLayer = self.projectLayer
+            checkWillRun = self.willRun
+            waitMsg = f'用例：{self.caseNum} 等待其他执行中的用例执行完毕... 最长等待间隔：{frequency}s'
+            condition = self._stateCondition()
+            cancelEvent = self.__cancelEvent
             try:
-                while usetime < self.timeout or self.timeout == -1:
-                    willRun = self.willRun(self.projectLayer)
-                    if willRun:
-                        break
-                    self.toLog.info(f'用例：{self.caseNum} 等待其他执行中的用例执行完毕... 等待间隔：{self.frequency}s')
-                    time.sleep(self.frequency)
-                    usetime = time.time() - start
-            except CaseStopCanceled:
-                self.toLog.warning(f'用例：{self.caseNum} 等待中... 已取消')
-                self.dtLog.warning(f'用例：{self.caseNum} 等待中... 已取消')
-                self.__running = RunningStatus.Canceled
-                self.__totalTime = datetime.datetime.now() - self.launchTime
-                self.__totalTime_count += self.__totalTime
+                with condition:
+                    while usetime < timeout or timeout == -1:
+                        if cancelEvent.is_set():
+                            raise CaseStopCanceled(f'用例：{self.caseNum} 已被请求取消')
+                        willRun = checkWillRun(projectLayer)
+                        if willRun:
+                            break
+                        toLog.info(waitMsg)
+                        wait = frequency if timeout == -1 else min(frequency, timeout - usetime)
+                        condition.wait(wait)  # 其他用例/步骤到达终态时会notify，无需睡满整个间隔
+                        usetime = time.monotonic() - start
+            except (CaseStopCanceled, CaseStopExit) as err:
+                status, level, verb, reraise = _STOP_HANDLERS[CaseStopExit if isinstance(err, CaseStopExit)
+                                                              else CaseStopCanceled]
+                msg = f'用例：{self.caseNum} 等待中... {verb}'
+                getattr(self.toLog, level)(msg)
+                getattr(self.dtLog, level)(msg)
+                self._finalizeWait(status)
+                if reraise:
+                    raise
                 return self.isPass
-            except CaseStopExit:
-                self.toLog.error(f'用例：{self.caseNum} 等待中... 退出执行！')
-                self.dtLog.error(f'用例：{self.caseNum} 等待中... 退出执行！')
-                self.__running = RunningStatus.Killed
-                self.__totalTime = datetime.datetime.now() - self.launchTime
-                self.__totalTime_count += self.__totalTime
-                raise
             if not willRun:
-                self.__running = RunningStatus.Timeout
-                self.__totalTime = datetime.datetime.now() - self.launchTime
-                self.__totalTime_count += self.__totalTime
+                self._finalizeWait(RunningStatus.Timeout)
                 msg = f'用例执行失败，等待其他执行中的用例执行完毕超时！用例：{self.caseNum}，等待总时长：{usetime}s'
                 self.toLog.error(msg)
                 return self.isPass
@@ -629,73 +799,114 @@ class CaseLayer:
         def main_run(oneCaseLoopMsg: OneCaseLoopMsg):
             """执行用例"""
             self.error_count = 0
-            self.__running = RunningStatus.Running
+            self._setRunning(RunningStatus.Running)
             self.__beginTime = datetime.datetime.now()
+            self.__beginTime_mono = time.monotonic()
+            dtLog = self.dtLog
+            dtLogMode = self.projectLayer.dtLogMode
             flag = self.flag or ''
             flagMsg = (f'({flag})' if flag else '').ljust(10, ' ')
-            self.toLog.info(f'--> *执行用例* {flagMsg}: {self.descriptionSimple}')
-            if self.projectLayer.dtLogMode in (Enums.DtLogMode_start, Enums.DtLogMode_both):
-                self.dtLog.info(self.caseFullName)
+            _logInfo(self.toLog, lambda: f'--> *执行用例* {flagMsg}: {self.descriptionSimple}')
+            if dtLogMode in (Enums.DtLogMode_start, Enums.DtLogMode_both):
+                dtLog.info(self.caseFullName)
             try:
                 case_result = self.caseRunFunc()
                 if not isinstance(case_result, type(baseConfig.successFlag)):
                     raise TypeError(f'用例函数定义应返回 {type(baseConfig.successFlag)}（{baseConfig.successFlag}表示成功），然而实际返回为{type(case_result)}')
-            except CaseStopCanceled:
-                self.toLog.warning(f'用例：{self.caseNum} 执行中... 已取消')
-                self.dtLog.warning(f'用例：{self.caseNum} 执行中... 已取消')
-                self.__running = RunningStatus.Canceled
+            except (CaseStopCanceled, CaseStopExit) as err:
+                status, level, verb, reraise = _STOP_HANDLERS[CaseStopExit if isinstance(err, CaseStopExit)
+                                                              else CaseStopCanceled]
+                msg = f'用例：{self.caseNum} 执行中... {verb}'
+                getattr(self.toLog, level)(msg)
+                getattr(dtLog, level)(msg)
+                self._setRunning(status)
+                if reraise:
+                    raise
                 return self.isPass
-            except CaseStopExit:
-                self.toLog.error(f'用例：{self.caseNum} 执行中... 退出执行！')
-                self.dtLog.error(f'用例：{self.caseNum} 执行中... 退出执行！')
-                self.__running = RunningStatus.Killed
-                raise
             except Exception as err:
-                err_msg = f'{err.__class__.__name__}: {err}\nAt: \n{traceback.format_exc().replace(str(Path.cwd()), "")}'
+                err_msg = f'{err.__class__.__name__}: {err}\nAt: \n{traceback.format_exc().replace(os.getcwd(), "")}'
                 oneCaseLoopMsg.error = err_msg
                 self.toLog.error(f'异常错误：{err_msg}')
-                if self.projectLayer.dtLogMode in (Enums.DtLogMode_end, Enums.DtLogMode_both):
-                    self.dtLog.error(f'执行用例发生异常：{err_msg}')
+                if dtLogMode in (Enums.DtLogMode_end, Enums.DtLogMode_both):
+                    dtLog.error(f'执行用例发生异常：{err_msg}')
                 self.error_count += 1
-                self.__running = RunningStatus.Error
-                self.__isPass = False
+                self._setRunning(RunningStatus.Error, False)
                 return self.isPass
             else:
                 self.error_count += case_result != baseConfig.successFlag
                 if self.error_count == 0:
-                    self.__running = RunningStatus.Finished
-                    self.__isPass = True
+                    self._setRunning(RunningStatus.Finished, True)
                     return self.isPass
-                self.__running = RunningStatus.Finished
-                self.__isPass = False
+                self._setRunning(RunningStatus.Finished, False)
                 return self.isPass
             finally:
                 self.__run_count += 1
+                self._invalidateDescription()
                 oneCaseLoopMsg.isPass = self.isPass
-                now = datetime.datetime.now()
-                oneCaseLoopMsg.duration = self.__duration = now - self.beginTime
-                self.__totalTime = now - self.launchTime
+                end_mono = time.monotonic()
+                oneCaseLoopMsg.duration = self.__duration = datetime.timedelta(seconds=end_mono - self.__beginTime_mono)
+                self.__totalTime = datetime.timedelta(seconds=end_mono - self.__launchTime_mono)
                 self.__totalTime_count += self.__totalTime
-                oneCaseLoopMsg.stepErrors = tuple([f'Error in Step: [{stepLayer.step}]\n-----\n{stepLayer.error}'
-                                                   for stepLayer in self.steps if stepLayer.error])
-                self.__CaseStatus.loopMsgs += (oneCaseLoopMsg,)
-                if self.projectLayer.dtLogMode in (Enums.DtLogMode_end, Enums.DtLogMode_both):
+                steps = self.__steps
+                oneCaseLoopMsg.stepErrors = tuple(f'Error in Step: [{stepLayer.step}]\n-----\n{stepLayer.error}'
+                                                  for stepLayer in steps if stepLayer.error) if steps else ()
+                self.__loopMsgs.append(oneCaseLoopMsg)
+                if dtLogMode in (Enums.DtLogMode_end, Enums.DtLogMode_both):
                     if self.isPass is None:
-                        self.dtLog.error(f"{self.caseFullName} *** failed! *** ---execute break---")
+                        dtLog.error(f"{self.caseFullName} *** failed! *** ---execute break---")
                     elif not self.isPass:
-                        self.dtLog.error(f"{self.caseFullName} *** failed! ***")
+                        dtLog.error(f"{self.caseFullName} *** failed! ***")
                     elif self.isPass:
-                        self.dtLog.info(f"{self.caseFullName} *** succeeded! ***")
+                        dtLog.info(f"{self.caseFullName} *** succeeded! ***")
 
         for i in range(self.loop):
             if self.loop > 1:
                 self.dtLog.info(f'循环执行用例 *Loop[{i + 1}/{self.loop}]*'.center(60, '-'))
             if not self.locked:  # 不锁定，不要求独立执行，则不需要线程锁
                 main_run(OneCaseLoopMsg(loopIndex=i))
-            with CaseLayer.lock:
-                main_run(OneCaseLoopMsg(loopIndex=i))
+            else:
+                with self._runLock():
+                    main_run(OneCaseLoopMsg(loopIndex=i))
         return self.isPass
 
+    def _finalizeWait(self, status: RunningStatus):
+        """等待阶段终止（超时/取消/退出）时的统一收尾：置状态并结算从启动起的总耗时"""
+        self._setRunning(status)
+        self.__totalTime = datetime.timedelta(seconds=time.monotonic() - self.__launchTime_mono)
+        self.__totalTime_count += self.__totalTime
+
+    def cancel(self):
+        """请求取消本用例的执行（一次性，不可撤销）
+
+        等待中的用例会被立即唤醒并以 Canceled 状态结束，无需等到下个检查间隔；
+        执行中的用例体仍沿用在用例函数内抛出 `CaseStopCanceled` 的既有方式取消。
+        """
+        self.__cancelEvent.set()
+        condition = self._stateCondition()
+        with condition:
+            condition.notify_all()
+
+    def _runLock(self) -> threading.Lock:
+        """锁定用例执行用的互斥锁：优先取所属项目的用例锁（锁粒度到项目），无根项目时退回类级锁
+
+        注意：锁必须覆盖整个用例体——锁定用例的语义是独占执行，
+        提前释放会让两个锁定用例在 willRun 判断间隙同时进入执行。
+        """
+        try:
+            return self.projectLayer.caseLock
+        except AttributeError:
+            return CaseLayer.lock
+
+    async def runAsync(self) -> Optional[bool]:
+        """以协程方式执行本用例
+
+        阻塞的用例体经 ``asyncio.to_thread`` 放入线程执行，等待/锁定语义
+        仍由线程锁与条件变量保证，事件循环不会被阻塞。
+
+        :return: 是否通过（跳过时为None）
+        """
+        return await asyncio.to_thread(self.run)
+
 
 from .ProjectLayer import ProjectLayer
 from .FeatureLayer import FeatureLayer
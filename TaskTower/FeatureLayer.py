@@ -7,15 +7,31 @@
 # ========================================
 from __future__ import annotations
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
 from types import ModuleType
 from typing import List, Tuple, Union, Optional, Callable, Dict, Any
-from xml.dom import minidom
-from lxml import etree
+from typing import TYPE_CHECKING
 
-from .BaseType import *
+from .BaseType import RunningStatus, Enums
+
+if TYPE_CHECKING:
+    from lxml import etree
+
+_RUNNING = RunningStatus.Running  # 模块级常量，省去热点比较处的两级属性查找
 
 class FeatureLayer:
     """一个业务功能分类层级对象(目录)，储存该业务功能分类下的所有用例函数对象，也可储存父级、子级功能分类对象"""
+    __slots__ = (
+        '_FeatureLayer__feature_name', '_FeatureLayer__parent',
+        '_FeatureLayer__children', '_FeatureLayer__childrenView',
+        '_FeatureLayer__caseLayerList', '_FeatureLayer__caseLayerListView', '_FeatureLayer__caseByNum',
+        '_FeatureLayer__caseLayer_ids', '_FeatureLayer__caseFunc_ids',
+        '_FeatureLayer__descCache', '_FeatureLayer__countCache',
+        '_FeatureLayer__setup', '_FeatureLayer__teardown',
+        '_FeatureLayer__projectLayer', '_rev', 'parallelChildren',
+    )
 
     def __init__(self, name: str, projectLayer, *, parentFeatureLayer=None, caseLayerList=None):
         """功能分类层级，包括父/子功功能分类层级、用例层级列表
@@ -33,11 +49,20 @@ class FeatureLayer:
             raise TypeError('父级只能是 FeatureLayer！')
         self.__feature_name: str = name
         self.__parent: FeatureLayer = parentFeatureLayer
-        self.__children: Tuple[FeatureLayer, ...] = ()
-        self.__caseLayerList: Tuple[CaseLayer, ...] = caseLayerList and tuple(caseLayerList) or ()
+        self.__children: List[FeatureLayer] = []  # 内部列表，append为O(1)
+        self.__childrenView = None  # 缓存的不可变视图，添加时失效
+        self.__caseLayerList: List[CaseLayer] = caseLayerList and list(caseLayerList) or []
+        self.__caseLayerListView = None
+        self.__caseByNum: Dict[str, CaseLayer] = {c.caseNum: c for c in self.__caseLayerList}  # 用例编号索引
+        self.__caseLayer_ids = {id(c) for c in self.__caseLayerList}  # 去重用id集合，成员判断O(1)
+        self.__caseFunc_ids = {id(c.caseFunc) for c in self.__caseLayerList}
+        self._rev = 0  # 结构修订号，结构变更时递增，用于描述缓存失效
+        self.__descCache: Dict[str, Tuple[int, str]] = {}  # 描述缓存：名称 -> (修订号, 渲染结果)
+        self.__countCache: Dict[Tuple, Tuple[int, int]] = {}  # 应执行用例数缓存：筛选条件 -> (修订号, 数量)
         self.__setup: CaseLayer | None = None
         self.__teardown: CaseLayer | None = None
         self.__projectLayer = projectLayer
+        self.parallelChildren = False  # 是否并行执行各子功能分类（子分类相互独立时可开启）
         if self not in projectLayer.featureLayers:
             projectLayer.addFeatureLayer(self)
 
@@ -47,36 +72,46 @@ class FeatureLayer:
     @property
     def descriptionDetails(self):
         """最详细的自我描述"""
-        xml_str = self.descriptionFull
-        tree: etree._ElementTree = etree.ElementTree(etree.fromstring(xml_str))
-        root: etree._Element = tree.getroot()
+        from lxml import etree  # 延迟导入，首次调用后走sys.modules缓存
+        return etree.tostring(self._descriptionDetailsElement(), pretty_print=True, encoding='unicode')
+
+    def _descriptionDetailsElement(self) -> etree._Element:
+        """构建最详细自我描述的 _Element 树，子层级直接以元素拼接、不经字符串往返"""
+        root = self._descriptionFullElement()
         setupEle: etree._Element = root.find('setup')
         teardownEle: etree._Element = root.find('teardown')
         childrenFeaturesEle: etree._Element = root.find('childrenFeatures')
         caseLayerListEle: etree._Element = root.find('caseLayerList')
         if self.setup:
             setupEle.clear()
-            setupEle.append(etree.ElementTree(etree.fromstring(self.setup.descriptionDetails)).getroot())
+            setupEle.append(self.setup._descriptionDetailsElement())
         if self.teardown:
             teardownEle.clear()
-            teardownEle.append(etree.ElementTree(etree.fromstring(self.teardown.descriptionDetails)).getroot())
-        childrenFeaturesEle.clear()
+            teardownEle.append(self.teardown._descriptionDetailsElement())
         for featureLayer in self.childrenFeatures:
-            childrenFeaturesEle.append(etree.ElementTree(etree.fromstring(featureLayer.descriptionDetails)).getroot())
-        caseLayerListEle.clear()
+            childrenFeaturesEle.append(featureLayer._descriptionDetailsElement())
+        caseLayerListEle.clear()  # 去掉完整描述已填充的简单元素，clear会连带清掉属性，count需重设
+        caseLayerListEle.set('count', str(len(self.caseLayerList)))
         for caseLayer in self.caseLayerList:
-            case_tree = etree.ElementTree(etree.fromstring(caseLayer.descriptionDetails))
-            case_root: etree._Element = case_tree.getroot()
+            case_root = caseLayer._descriptionDetailsElement()
             case_root.set('caseNum', caseLayer.caseNum)
             caseLayerListEle.append(case_root)
-
-        new_xml = minidom.parseString(etree.tostring(tree.getroot()).replace(b'\n',b'').replace(b'\t',b'')).toprettyxml()
-        new_xml: str = new_xml.replace('<?xml version="1.0" ?>', '')
-        return new_xml
+        return root
 
     @property
     def descriptionFull(self):
         """完整自我描述"""
+        cached = self.__descCache.get('full')
+        if cached is not None and cached[0] == self._rev:
+            return cached[1]
+        from lxml import etree
+        xml_str = etree.tostring(self._descriptionFullElement(), pretty_print=True, encoding='unicode')
+        self.__descCache['full'] = (self._rev, xml_str)
+        return xml_str
+
+    def _descriptionFullElement(self) -> etree._Element:
+        """构建完整自我描述的 _Element 树"""
+        from lxml import etree
         root = etree.Element('FeatureLayer')  # 根节点
         etree.SubElement(root, 'id', attrib={'value': str(id(self))})
         etree.SubElement(root, 'featureName', attrib={'value': str(self.featureName)})
@@ -87,23 +122,36 @@ class FeatureLayer:
         caseLayerListEle = etree.SubElement(root, 'caseLayerList', attrib={'count': str(len(self.caseLayerList))})
 
         if self.parentFeatureLayer:
-            parentFeatureEle.append(etree.ElementTree(etree.fromstring(self.parentFeatureLayer.descriptionSimple)).getroot())
+            parentFeatureEle.append(self.parentFeatureLayer._descriptionSimpleElement())
         if self.setup:
-            setupEle.append(etree.ElementTree(etree.fromstring(self.setup.descriptionSimple)).getroot())
+            setupEle.append(self.setup._descriptionSimpleElement())
         if self.teardown:
-            teardownEle.append(etree.ElementTree(etree.fromstring(self.teardown.descriptionSimple)).getroot())
+            teardownEle.append(self.teardown._descriptionSimpleElement())
         for caseLayer in self.caseLayerList:
-            caseLayerListEle.append(etree.ElementTree(etree.fromstring(caseLayer.descriptionSimple)).getroot())
-
-        tree = etree.ElementTree(root)
-        xml_str = minidom.parseString(etree.tostring(tree.getroot())).toprettyxml()
-        xml_str: str = xml_str.replace('<?xml version="1.0" ?>', '')
-        return xml_str
+            caseLayerListEle.append(caseLayer._descriptionSimpleElement())
+        return root
 
     @property
     def descriptionSimple(self):
         """简单自我描述"""
-        return f'<FeatureLayer id="{id(self)}" featureName="{self.featureName}" caseCount="{len(self.caseLayerList)}"/>'
+        cached = self.__descCache.get('simple')
+        if cached is not None and cached[0] == self._rev:
+            return cached[1]
+        description = f'<FeatureLayer id="{id(self)}" featureName="{self.featureName}" caseCount="{len(self.caseLayerList)}"/>'
+        self.__descCache['simple'] = (self._rev, description)
+        return description
+
+    def _bumpRev(self):
+        """结构变更时递增修订号并向父级传播，使缓存的描述失效"""
+        self._rev += 1
+        if self.__parent is not None:
+            self.__parent._bumpRev()
+
+    def _descriptionSimpleElement(self) -> etree._Element:
+        """简单自我描述的 _Element 形式，供上层直接拼接"""
+        from lxml import etree
+        return etree.Element('FeatureLayer', attrib={
+            'id': str(id(self)), 'featureName': str(self.featureName), 'caseCount': str(len(self.caseLayerList))})
 
     @property
     def projectLayer(self): return self.__projectLayer
@@ -114,9 +162,18 @@ class FeatureLayer:
     @property
     def parentFeatureLayer(self) -> Optional[FeatureLayer]: return self.__parent  # 父级功能分类对象
     @property
-    def childrenFeatures(self): return self.__children  # 子级功能分类对象
+    def childrenFeatures(self) -> Tuple[FeatureLayer, ...]:
+        """子级功能分类对象（不可变视图）"""
+        if self.__childrenView is None:
+            self.__childrenView = tuple(self.__children)
+        return self.__childrenView
+
     @property
-    def caseLayerList(self): return self.__caseLayerList  # 所有用例层级对象
+    def caseLayerList(self) -> Tuple[CaseLayer, ...]:
+        """所有用例层级对象（不可变视图）"""
+        if self.__caseLayerListView is None:
+            self.__caseLayerListView = tuple(self.__caseLayerList)
+        return self.__caseLayerListView
     @property
     def setup(self): return self.__setup  # setup用例函数层级
     @property
@@ -130,12 +187,14 @@ class FeatureLayer:
 
     def addChild(self, *childFeature):
         """添加子功能分类"""
-        if not all(map(lambda c: isinstance(c, FeatureLayer), childFeature)):
-            self.toLog.error(f'子级功能分类只能是 FeatureLayer！输入值：{childFeature}')
-            raise TypeError('子级功能分类只能是 FeatureLayer！')
         for _m in childFeature:
-            if _m not in self.childrenFeatures:
-                self.__children += (_m,)
+            if type(_m) is not FeatureLayer:  # 本框架不使用子类，直接比较具体类型更快
+                self.toLog.error(f'子级功能分类只能是 FeatureLayer！输入值：{_m!r}')
+                raise TypeError('子级功能分类只能是 FeatureLayer！')
+            if _m not in self.__children:
+                self.__children.append(_m)
+                self.__childrenView = None
+                self._bumpRev()
 
     def addCaseFunc(self, *caseFunc, dirName=None):
         """储存用例对象
@@ -146,39 +205,48 @@ class FeatureLayer:
         :return:
         """
         for oneCaseFunc in caseFunc:
-            if oneCaseFunc not in [cb.caseFunc for cb in self.caseLayerList]:
-                self.__caseLayerList += (CaseLayer(oneCaseFunc, featureLayer=self, dirName=dirName),)
+            if id(oneCaseFunc) not in self.__caseFunc_ids:
+                # CaseLayer 构造时会经 featureLayer 赋值回调 addCaseLayer 完成注册，这里不再重复append
+                _cLayer = CaseLayer(oneCaseFunc, featureLayer=self, dirName=dirName)
+                self.addCaseLayer(_cLayer)
 
     def addCaseLayer(self, *caseLayer: CaseLayer):
         """储存用例对象"""
-        if not all(map(lambda c: isinstance(c, CaseLayer), caseLayer)):
-            self.toLog.error(f'本函数只能添加 CaseLayer！输入值：{caseLayer}')
-            raise TypeError('本函数只能添加 CaseLayer！')
-        if not all(map(lambda c: c.featureLayer is None or c.featureLayer is self, caseLayer)):
-            self.toLog.error(f'只能添加本功能分类下的 CaseLayer！')
-            raise TypeError('只能添加本功能分类下的 CaseLayer！')
         for _cLayer in caseLayer:
+            if type(_cLayer) is not CaseLayer:  # 本框架不使用子类，直接比较具体类型更快
+                self.toLog.error(f'本函数只能添加 CaseLayer！输入值：{_cLayer!r}')
+                raise TypeError('本函数只能添加 CaseLayer！')
+            if _cLayer.featureLayer is not None and _cLayer.featureLayer is not self:
+                self.toLog.error(f'只能添加本功能分类下的 CaseLayer！')
+                raise TypeError('只能添加本功能分类下的 CaseLayer！')
             if _cLayer.featureLayer is None:
                 _cLayer.featureLayer = self
-            if _cLayer not in self.caseLayerList and _cLayer.flag not in ('setup', 'teardown'):
-                self.__caseLayerList += (_cLayer,)
+            if id(_cLayer) not in self.__caseLayer_ids and _cLayer.flag not in ('setup', 'teardown'):
+                self.__caseLayerList.append(_cLayer)
+                self.__caseLayerListView = None
+                self.__caseByNum.setdefault(_cLayer.caseNum, _cLayer)
+                self.__caseLayer_ids.add(id(_cLayer))
+                self.__caseFunc_ids.add(id(_cLayer.caseFunc))
+                self._bumpRev()
+                if self.projectLayer is not None:
+                    self.projectLayer._registerCaseLayer(_cLayer)
 
     def getCaseLayer(self, caseNum: str):
         """获取1个用例层对象"""
-        for caseLayer in self.caseLayerList:
-            if caseLayer.caseNum == caseNum:
-                return caseLayer
-        return None
+        return self.__caseByNum.get(caseNum)
 
     def setSetupCaseLayer(self, setupCaseLayer: CaseLayer):
         """设置setup用例层对象"""
-        if not isinstance(setupCaseLayer, CaseLayer):
+        if type(setupCaseLayer) is not CaseLayer:
             self.toLog.error(f'本函数只能添加 CaseLayer！输入值：{setupCaseLayer}')
             raise TypeError('本函数只能添加 CaseLayer！')
         setupCaseLayer.flag = 'setup'
         setupCaseLayer.featureLayer = self
         setupCaseLayer.dirName = self.dirName
         self.__setup = setupCaseLayer
+        self._bumpRev()
+        if self.projectLayer is not None:
+            self.projectLayer._registerCaseLayer(setupCaseLayer)
 
     def setSetupFunc(self, setupFunc, module):
         """设置setup用例函数
@@ -187,16 +255,22 @@ class FeatureLayer:
         :type module: ModuleType
         """
         self.__setup = CaseLayer(setupFunc, module, featureLayer=self, flag='setup', dirName=self.dirName)
+        self._bumpRev()
+        if self.projectLayer is not None:
+            self.projectLayer._registerCaseLayer(self.__setup)
 
     def setTeardownCaseLayer(self, teardownCaseLayer: CaseLayer):
         """设置teardown用例层对象"""
-        if not isinstance(teardownCaseLayer, CaseLayer):
+        if type(teardownCaseLayer) is not CaseLayer:
             self.toLog.error(f'本函数只能添加 CaseLayer！输入值：{teardownCaseLayer}')
             raise TypeError('本函数只能添加 CaseLayer！')
         teardownCaseLayer.flag = 'teardown'
         teardownCaseLayer.featureLayer = self
         teardownCaseLayer.dirName = self.dirName
         self.__teardown = teardownCaseLayer
+        self._bumpRev()
+        if self.projectLayer is not None:
+            self.projectLayer._registerCaseLayer(teardownCaseLayer)
 
     def setTeardownFunc(self, teardownFunc, module):
         """设置teardown用例函数
@@ -205,29 +279,33 @@ class FeatureLayer:
         :type module: ModuleType
         """
         self.__teardown = CaseLayer(teardownFunc, module, featureLayer=self, flag='teardown', dirName=self.dirName)
+        self._bumpRev()
+        if self.projectLayer is not None:
+            self.projectLayer._registerCaseLayer(self.__teardown)
 
     def getRunningCaseLayer(self) -> List[CaseLayer]:
-        """获取当前功能分类正在执行的用例，无则返回空"""
+        """获取当前功能分类正在执行的用例，无则返回空（迭代遍历，深层级不占用调用栈）"""
         runningCases = []
-        if self.setup is not None and self.setup.running == RunningStatus.Running:
-            runningCases.append(self.setup)
-        if self.teardown is not None and self.teardown.running == RunningStatus.Running:
-            runningCases.append(self.teardown)
-        for caseLayer in self.caseLayerList:
-            if caseLayer.running == RunningStatus.Running:
-                runningCases.append(caseLayer)
-        for childModule in self.childrenFeatures:
-            runningCases += childModule.getRunningCaseLayer()
+        stack = [self]
+        while stack:
+            featureLayer = stack.pop()
+            setup, teardown = featureLayer.setup, featureLayer.teardown
+            if setup is not None and setup.running == _RUNNING:
+                runningCases.append(setup)
+            if teardown is not None and teardown.running == _RUNNING:
+                runningCases.append(teardown)
+            runningCases.extend(c for c in featureLayer.caseLayerList if c.running == _RUNNING)
+            stack.extend(featureLayer.childrenFeatures)
         return runningCases
 
     def getWillRunCaseLayers(self) -> List[CaseLayer]:
-        """获取此功能分类下应该执行的所有用例"""
+        """获取此功能分类下应该执行的所有用例（迭代遍历，深层级不占用调用栈）"""
         willRunCases = []
-        for caseLayer in self.caseLayerList:
-            if caseLayer.shouldRun():
-                willRunCases.append(caseLayer)
-        for childModule in self.childrenFeatures:
-            willRunCases += childModule.getWillRunCaseLayers()
+        stack = [self]
+        while stack:
+            featureLayer = stack.pop()
+            willRunCases.extend(c for c in featureLayer.caseLayerList if c.shouldRun())
+            stack.extend(featureLayer.childrenFeatures)
         return willRunCases
 
     def shouldRun(self, feature: str = None):
@@ -235,27 +313,48 @@ class FeatureLayer:
         return not feature or feature == self.featureName
 
     def countRunCase(self) -> int:
-        """统计本功能分类有多少需执行的用例"""
+        """统计本功能分类有多少需执行的用例（结果按筛选条件缓存，结构变更后失效）"""
+        runBy = self.projectLayer.runBy
+        if runBy == Enums.RunBy_arguments:
+            return self._countRunCase(runBy, self.arguments.get('feature'), self.arguments['tag'],
+                                      self.arguments.get('untag', ''))
+        return self._countRunCase(runBy, None, None, None)
+
+    def _clearCountCache(self):
+        """清空本层及所有子层的应执行用例数缓存（每次运行开始时调用，丢弃上次筛选条件的残留项）"""
+        self.__countCache.clear()
+        for childFeature in self.childrenFeatures:
+            childFeature._clearCountCache()
+
+    def _countRunCase(self, runBy, feature, tag, untag) -> int:
+        """按已取出的筛选条件递归统计，避免每层递归重复读取运行参数"""
+        key = (runBy, feature, tag, untag) if runBy == Enums.RunBy_arguments else (runBy,)
+        cached = self.__countCache.get(key)
+        if cached is not None and cached[0] == self._rev:
+            return cached[1]
         count = 0
-        if self.projectLayer.runBy == Enums.RunBy_arguments:
-            feature = self.arguments.get('feature')
-            tag = self.arguments['tag']
-            untag = self.arguments.get('untag', '')
+        if runBy == Enums.RunBy_arguments:
             if not self.shouldRun(feature):
+                self.__countCache[key] = (self._rev, 0)
                 return 0
-            count += sum([c.shouldRun(tag, untag) for c in self.caseLayerList])
-        elif self.projectLayer.runBy == Enums.RunBy_skip:
-            count += sum([not c.skip for c in self.caseLayerList])
+            count += sum(c.shouldRun(tag, untag) for c in self.__caseLayerList)
+        elif runBy == Enums.RunBy_skip:
+            count += sum(not c.skip for c in self.__caseLayerList)
         for childFeature in self.childrenFeatures:
-            count += childFeature.countRunCase()
+            count += childFeature._countRunCase(runBy, feature, tag, untag)
+        self.__countCache[key] = (self._rev, count)
         return count
 
     def sortCaseLayerList(self):
-        """将 CaseLayerList 按执行顺序排序"""
-        caseLayerList = list(self.caseLayerList)
-        caseLayerList.sort(key=lambda b: b.caseNum)
-        caseLayerList.sort(key=lambda b: b.order)
-        self.__caseLayerList = tuple(caseLayerList)
+        """将 CaseLayerList 按执行顺序排序
+
+        排序键为（次序号, 是否锁定, 用例编号）：同一次序号内不锁定的用例先执行、
+        锁定（独占执行）的用例靠后，使可并行的主体先跑、串行的尾部更短；
+        除该锁定次序外不做多余的重排，原有相对顺序保持稳定。
+        """
+        self.__caseLayerList.sort(key=attrgetter('order', 'locked', 'caseNum'))
+        self.__caseLayerListView = None
+        self._bumpRev()
 
     def run(self):
         """执行该功能分类的用例
@@ -285,14 +384,63 @@ class FeatureLayer:
                 ok += 1
             else:
                 no += 1
-        for childFeatureLayer in self.childrenFeatures:
-            _ok, _no = childFeatureLayer.run()
+        childrenFeatures = self.childrenFeatures
+        if self.parallelChildren and len(childrenFeatures) > 1:
+            # 子功能分类相互独立时并行执行，锁定用例仍由 CaseLayer/StepLayer 的线程锁串行化
+            with ThreadPoolExecutor(max_workers=len(childrenFeatures)) as executor:
+                for _ok, _no in executor.map(lambda child: child.run(), childrenFeatures):
+                    ok += _ok
+                    no += _no
+        else:
+            for childFeatureLayer in childrenFeatures:
+                _ok, _no = childFeatureLayer.run()
+                ok += _ok
+                no += _no
+        if self.teardown is not None:
+            self.dtLog.info('')
+            self.dtLog.info(f' {self.featureName} Teardown Start '.center(75, '-'))
+            self.teardown.run()
+        return ok, no
+
+    async def runAsync(self):
+        """以协程方式执行该功能分类的用例
+
+        本层用例按原顺序执行（阻塞的用例体经 ``asyncio.to_thread`` 放入线程，
+        锁定语义仍由 CaseLayer/StepLayer 的线程锁保证），相互独立的子功能分类
+        则通过 ``asyncio.gather`` 并发执行。
+
+        :return: 成功数、失败数
+        """
+        ok = no = 0
+        case_run_count = self.countRunCase()
+        if case_run_count == 0:
+            return ok, no
+
+        if self.setup is not None:
+            self.dtLog.info('')
+            self.dtLog.info(f' {self.featureName} Setup Start '.center(75, '-'))
+            if not await asyncio.to_thread(self.setup.run):
+                return ok, no
+
+        self.dtLog.info('')
+        self.dtLog.info(' Test Start '.center(75, '-'))
+        self.dtLog.info(f' start execute module: {self.featureName} '.center(75, '-'))
+        self.sortCaseLayerList()
+        for caseLayer in self.caseLayerList:
+            isPass = await asyncio.to_thread(caseLayer.run)
+            if isPass is None:
+                continue
+            elif isPass:
+                ok += 1
+            else:
+                no += 1
+        for _ok, _no in await asyncio.gather(*[child.runAsync() for child in self.childrenFeatures]):
             ok += _ok
             no += _no
         if self.teardown is not None:
             self.dtLog.info('')
             self.dtLog.info(f' {self.featureName} Teardown Start '.center(75, '-'))
-            self.teardown.run()
+            await asyncio.to_thread(self.teardown.run)
         return ok, no
 
 from .ProjectLayer import ProjectLayer
@@ -7,22 +7,28 @@
 # ========================================
 from __future__ import annotations
 
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import attrgetter
 from pathlib import Path
 from logging import Logger
 from types import ModuleType
 from typing import List, Tuple, Union, Optional, Callable, Dict, Any
-from xml.dom import minidom
 from lxml import etree
 
 from .BaseType import *
 
 __all__ = ['ProjectLayer', 'FeatureLayer', 'CaseLayer', 'RunningStatus']
 
+_PROJECT_SETUP_BANNER = ' Project Setup Start '.center(75, '-')  # 分隔横幅为常量，免去每次运行重复填充
+_PROJECT_TEARDOWN_BANNER = ' Project Teardown Start '.center(75, '-')
+_UNSET = object()  # “尚未设置”哨兵，与空dict区分开
+
 
 class ProjectLayer:
     """一个项目层对象，包含所有功能分类、所有用例函数对象"""
     def __init__(self, projectPath: Path, toLog:Logger=None, dtLog:Logger=None, *, dtLogMode=Enums.DtLogMode_end,
-                 runBy=Enums.RunBy_skip):
+                 runBy=Enums.RunBy_skip, parallelFeatures=1):
         """项目层级，存储一个项目的所有功能分类、用例函数
 
         :param projectPath: 项目路径
@@ -30,16 +36,29 @@ class ProjectLayer:
         :param dtLog: 用于记录用例执行详情的日志对象。默认空。`dt` 是 `detail` 的简写。
         :param dtLogMode: dtLog在用例执行前后的记录模式：no-执行前后不记录，end-只记录执行完毕，start-只记录执行前，both-前后都记录
         :param runBy: 执行用例的筛选方式，arguments-通过赋值arguments，skip-通过用例skip属性
+        :param int parallelFeatures: 顶层功能分类的并行线程数，默认1（串行）。各分类相互独立时可调大，锁定语义仍由用例/步骤锁保证
         """
         self.__projectPath = projectPath
-        self.__featureLayers: Tuple[FeatureLayer, ...] = ()
+        self.__featureLayers: List[FeatureLayer] = []
+        self.__featureLayersView = None  # featureLayers属性的不可变视图缓存
+        self.__featureLayer_ids = set()  # 已添加功能分类的id集合，去重判断为O(1)
+        self.__featureByName: Dict[str, FeatureLayer] = {}  # 功能分类名索引
+        self.__caseLayerById: Dict[int, CaseLayer] = {}  # 用例层id索引，登记后查询为O(1)
+        self.__shapeRev = 0  # 项目结构修订号，setup/teardown/功能分类变更时递增
+        self.__descCache: Dict[str, Tuple[tuple, str]] = {}  # 描述缓存：名称 -> (版本, 渲染结果)
         self.__setup: CaseLayer | None = None
         self.__teardown: CaseLayer | None = None
         self.toLog = toLog
         self.dtLog = dtLog
         self.__dtLogMode = dtLogMode
         self.runBy = runBy
-        self.__arguments = {}
+        self.parallelFeatures = parallelFeatures
+        self.__arguments = _UNSET
+        self.stepLock = threading.Lock()  # 本项目内锁定步骤的互斥锁
+        self.caseLock = threading.Lock()  # 本项目内锁定用例的互斥锁
+        self._stateCondition = threading.Condition()  # 步骤/用例到达终态时notify，唤醒等待执行的层级
+        self.__runningCount = 0  # 当前处于Running状态的用例数，由CaseLayer状态变更时维护
+        self.__runningCountLock = threading.Lock()  # 运行计数的写保护锁
 
     def __str__(self): return self.descriptionFull
     def __repr__(self): return f'ProjectLayer(projectPath={self.projectPath!r})'
@@ -47,61 +66,77 @@ class ProjectLayer:
     @property
     def descriptionDetails(self):
         """最详细的自我描述，展示所有层级"""
-        xml_str = self.descriptionFull
-        tree: etree._ElementTree = etree.ElementTree(etree.fromstring(xml_str))
-        root: etree._Element = tree.getroot()
+        return etree.tostring(self._descriptionDetailsElement(), pretty_print=True, encoding='unicode')
+
+    def _descriptionDetailsElement(self) -> etree._Element:
+        """构建最详细自我描述的 _Element 树，子层级直接以元素拼接、不经字符串往返"""
+        root = self._descriptionFullElement()
         setupEle: etree._Element = root.find('setup')
         teardownEle: etree._Element = root.find('teardown')
         featureLayersEle: etree._Element = root.find('featureLayers')
         if self.setup:
             setupEle.clear()
-            setupEle.append(etree.ElementTree(etree.fromstring(self.setup.descriptionDetails)).getroot())
+            setupEle.append(self.setup._descriptionDetailsElement())
         if self.teardown:
             teardownEle.clear()
-            teardownEle.append(etree.ElementTree(etree.fromstring(self.teardown.descriptionDetails)).getroot())
+            teardownEle.append(self.teardown._descriptionDetailsElement())
         featureLayersEle.clear()
         for feature in self.featureLayers:
-            feature_tree = etree.ElementTree(etree.fromstring(feature.descriptionDetails))
-            feature_root: etree._Element = feature_tree.getroot()
+            feature_root = feature._descriptionDetailsElement()
             feature_root.set('featureName', feature.featureName)
             featureLayersEle.append(feature_root)
-        new_xml = minidom.parseString(etree.tostring(tree.getroot()).replace(b'\n',b'').replace(b'\t',b'')).toprettyxml()
-        new_xml: str = new_xml.replace('<?xml version="1.0" ?>', '')
-        return new_xml
+        return root
 
     @property
     def descriptionFull(self):
-        """完整自我描述"""
+        """完整自我描述（按项目结构版本缓存，结构不变时直接返回）"""
+        version = self._descVersion()
+        cached = self.__descCache.get('full')
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        xml_str = etree.tostring(self._descriptionFullElement(), pretty_print=True, encoding='unicode')
+        self.__descCache['full'] = (version, xml_str)
+        return xml_str
+
+    def _descriptionFullElement(self) -> etree._Element:
+        """构建完整自我描述的 _Element 树"""
         root = etree.Element('ProjectLayer')  # 根节点
         etree.SubElement(root, 'id', attrib={'value': str(id(self))})
         etree.SubElement(root, 'projectName', attrib={'value': str(self.projectName)})
         etree.SubElement(root, 'projectPath', attrib={'projectPath': str(self.projectPath)})
         setupEle = etree.SubElement(root, 'setup')
         teardownEle = etree.SubElement(root, 'teardown')
-        featureLayerEle = etree.SubElement(root, 'featureLayers', attrib={'count': str(len(self.featureLayers))})
+        featureLayers = self.featureLayers  # 视图取一次，供计数与遍历共用
+        featureLayerEle = etree.SubElement(root, 'featureLayers', attrib={'count': str(len(featureLayers))})
 
         if self.setup:
-            setupEle.append(etree.ElementTree(etree.fromstring(self.setup.descriptionSimple)).getroot())
+            setupEle.append(self.setup._descriptionSimpleElement())
         if self.teardown:
-            teardownEle.append(etree.ElementTree(etree.fromstring(self.teardown.descriptionSimple)).getroot())
-        for feature in self.featureLayers:
-            featureLayerEle.append(etree.ElementTree(etree.fromstring(feature.descriptionSimple)).getroot())
-
-        tree = etree.ElementTree(root)
-        xml_str = minidom.parseString(etree.tostring(tree.getroot())).toprettyxml()
-        xml_str: str = xml_str.replace('<?xml version="1.0" ?>', '')
-        return xml_str
+            teardownEle.append(self.teardown._descriptionSimpleElement())
+        for feature in featureLayers:
+            featureLayerEle.append(feature._descriptionSimpleElement())
+        return root
 
     @property
     def descriptionSimple(self):
-        """简单自我描述"""
-        feature_names = ';'.join([feature.featureName for feature in self.featureLayers])
-        return f'<ProjectLayer id="{id(self)}" projectName="{self.projectName}" features="{feature_names}"/>'
+        """简单自我描述（按项目结构版本缓存）"""
+        version = self._descVersion()
+        cached = self.__descCache.get('simple')
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        feature_names = ';'.join(feature.featureName for feature in self.featureLayers)
+        description = f'<ProjectLayer id="{id(self)}" projectName="{self.projectName}" features="{feature_names}"/>'
+        self.__descCache['simple'] = (version, description)
+        return description
 
     @property
     def dtLogMode(self): return self.__dtLogMode
     @property
-    def featureLayers(self): return self.__featureLayers  # 所有功能分类层对象
+    def featureLayers(self) -> Tuple[FeatureLayer, ...]:
+        """所有功能分类层对象（不可变视图）"""
+        if self.__featureLayersView is None:
+            self.__featureLayersView = tuple(self.__featureLayers)
+        return self.__featureLayersView
     @property
     def projectPath(self): return self.__projectPath  # 项目路径
     @property
@@ -114,25 +149,29 @@ class ProjectLayer:
     @property
     def toLog(self) -> Logger:
         """用于记录简要和重要信息的日志对象，应仅用于扼要信息记录"""
-        return self.__toLog if self.__toLog is not None else emptyLogger
+        return self.__toLog
 
     @property
     def dtLog(self) -> Logger:
         """用于记录用例执行详情的日志对象，可用于外部调用"""
-        return self.__dtLog if self.__dtLog is not None else emptyLogger
+        return self.__dtLog
 
     @toLog.setter
     def toLog(self, logger: Logger):
-        """用于记录简要和重要信息的日志对象，应仅用于扼要信息记录"""
-        if hasattr(logger, 'info') and hasattr(logger, 'error') or logger is None:
+        """用于记录简要和重要信息的日志对象，应仅用于扼要信息记录。None回落到emptyLogger"""
+        if logger is None:
+            self.__toLog = emptyLogger
+        elif hasattr(logger, 'info') and hasattr(logger, 'error'):
             self.__toLog = logger
         else:
             raise TypeError('设置日志对象至少必须含有`info`和`error`方法！')
 
     @dtLog.setter
     def dtLog(self, logger: Logger):
-        """用于记录用例执行详情的日志对象，可用于外部调用"""
-        if hasattr(logger, 'info') and hasattr(logger, 'error') or logger is None:
+        """用于记录用例执行详情的日志对象，可用于外部调用。None回落到emptyLogger"""
+        if logger is None:
+            self.__dtLog = emptyLogger
+        elif hasattr(logger, 'info') and hasattr(logger, 'error'):
             self.__dtLog = logger
         else:
             raise TypeError('设置日志对象至少必须含有`info`和`error`方法！')
@@ -150,7 +189,7 @@ class ProjectLayer:
     @property
     def arguments(self):
         """本次运行参数"""
-        if not self.__arguments:
+        if self.__arguments is _UNSET:
             raise ValueError('本次运行参数尚未设置！')
         return self.__arguments
 
@@ -197,10 +236,10 @@ class ProjectLayer:
             return
         try:
             for featureName, caseLoopDic in caseLoops.items():
+                featureLayer = self.getFeatureLayer(featureName)  # 每个分类只查一次名索引
+                if not featureLayer:
+                    continue
                 for caseNum, loop in caseLoopDic.items():
-                    featureLayer = self.getFeatureLayer(featureName)
-                    if not featureLayer:
-                        continue
                     caseLayer = featureLayer.getCaseLayer(caseNum)
                     if caseLayer:
                         caseLayer.loop = loop
@@ -209,32 +248,36 @@ class ProjectLayer:
 
     def getFeatureLayer(self, featureName: str):
         """获取一个 FeatureLayer"""
-        for featureLayer in self.featureLayers:
-            if featureLayer.featureName == featureName:
-                return featureLayer
-        return None
+        return self.__featureByName.get(featureName)
 
     def addFeatureLayer(self, *featureLayer: FeatureLayer):
         """添加功能分类层对象"""
-        if not all(map(lambda f: isinstance(f, FeatureLayer), featureLayer)):
-            self.toLog.error(f'只能添加 FeatureLayer！输入值：{featureLayer}')
-            raise TypeError('只能添加 FeatureLayer！')
-        if not all(map(lambda f: f.projectLayer is self, featureLayer)):
-            self.toLog.error(f'只能添加相同根项目的 FeatureLayer！')
-            raise TypeError(f'只能添加相同根项目的 FeatureLayer！')
-        for _f in featureLayer:
-            if _f not in self.featureLayers:
-                self.__featureLayers += (_f,)
+        for _f in featureLayer:  # 校验与插入合并为单次遍历，遇到非法输入立即抛出
+            if type(_f) is not FeatureLayer:  # 本框架不使用子类，直接比较具体类型更快
+                self.toLog.error(f'只能添加 FeatureLayer！输入值：{featureLayer}')
+                raise TypeError('只能添加 FeatureLayer！')
+            if _f.projectLayer is not self:
+                self.toLog.error(f'只能添加相同根项目的 FeatureLayer！')
+                raise TypeError(f'只能添加相同根项目的 FeatureLayer！')
+            if id(_f) not in self.__featureLayer_ids:
+                self.__featureLayer_ids.add(id(_f))
+                self.__featureLayers.append(_f)
+                self.__featureLayersView = None
+                self._bumpShapeRev()
+                self.__featureByName.setdefault(_f.featureName, _f)
+                for caseLayer in _f.caseLayerList:  # 构造时已携带的用例一并登记
+                    self.__caseLayerById[caseLayer.id] = caseLayer
 
     def setSetupCaseLayer(self, setupCaseLayer: CaseLayer):
         """设置setup用例函数层"""
-        if not isinstance(setupCaseLayer, CaseLayer):
+        if type(setupCaseLayer) is not CaseLayer:
             self.toLog.error(f'只能设置 CaseLayer！输入值：{setupCaseLayer}')
             raise TypeError('只能设置 CaseLayer！')
         setupCaseLayer.projectLayer = self
         setupCaseLayer.level = 'project'
         setupCaseLayer.flag = 'setup'
         self.__setup = setupCaseLayer
+        self._registerCaseLayer(setupCaseLayer)
 
     def setSetupFunc(self, setupFunc, module):
         """设置setup用例函数
@@ -243,16 +286,18 @@ class ProjectLayer:
         :type module: ModuleType
         """
         self.__setup = CaseLayer(setupFunc, module, projectLayer=self, level='project', flag='setup')
+        self._registerCaseLayer(self.__setup)
 
     def setTeardownCaseLayer(self, teardownCaseLayer: CaseLayer):
         """设置teardown用例函数层"""
-        if not isinstance(teardownCaseLayer, CaseLayer):
+        if type(teardownCaseLayer) is not CaseLayer:
             self.toLog.error(f'只能设置 CaseLayer！输入值：{teardownCaseLayer}')
             raise TypeError('只能设置 CaseLayer！')
         teardownCaseLayer.projectLayer = self
         teardownCaseLayer.level = 'project'
         teardownCaseLayer.flag = 'teardown'
         self.__teardown = teardownCaseLayer
+        self._registerCaseLayer(teardownCaseLayer)
 
     def setTeardownFunc(self, teardownFunc, module):
         """设置teardown用例函数
@@ -261,17 +306,24 @@ class ProjectLayer:
         :type module: ModuleType
         """
         self.__teardown = CaseLayer(teardownFunc, module, projectLayer=self, level='project', flag='teardown')
+        self._registerCaseLayer(self.__teardown)
 
     def getRunningCaseLayers(self) -> List[CaseLayer]:
         """获取当前所有正在运行的用例函数层"""
-        runningCaseLayers = []
+        return list(self.iterRunningCaseLayers())
+
+    def iterRunningCaseLayers(self):
+        """惰性遍历当前正在运行的用例函数层，调用方短路时不必收集完整列表"""
         if self.setup is not None and self.setup.running == RunningStatus.Running:
-            runningCaseLayers.append(self.setup)
+            yield self.setup
         if self.teardown is not None and self.teardown.running == RunningStatus.Running:
-            runningCaseLayers.append(self.teardown)
+            yield self.teardown
         for featureLayer in self.featureLayers:
-            runningCaseLayers += featureLayer.getRunningCaseLayer()
-        return runningCaseLayers
+            yield from featureLayer.getRunningCaseLayer()
+
+    def hasRunningCases(self) -> bool:
+        """当前是否有正在运行的用例（命中第一个即返回）"""
+        return next(self.iterRunningCaseLayers(), None) is not None
 
     def getAllCaseStatus(self, exceptUnRun=False) -> AllCaseStatus:
         """获取当前项目所有用例的执行状态
@@ -280,18 +332,20 @@ class ProjectLayer:
         :return: 所有用例的运行状态数据对象
         """
         all_status = AllCaseStatus()
+        runningCases, allCases = [], []  # 先收集到本地列表，最后一次性转为元组，避免元组重复拼接
         if self.setup is not None and self.setup.running == RunningStatus.Running:
-            all_status.runningCases += (self.setup.CaseStatus,)
+            runningCases.append(self.setup.CaseStatus)
         if self.teardown is not None and self.teardown.running == RunningStatus.Running:
-            all_status.runningCases += (self.teardown.CaseStatus,)
+            runningCases.append(self.teardown.CaseStatus)
         for featureLayer in self.featureLayers:
-            runningCases = featureLayer.getRunningCaseLayer()
-            for oneCase in runningCases:
-                all_status.runningCases += (oneCase.CaseStatus,)
+            for oneCase in featureLayer.getRunningCaseLayer():
+                runningCases.append(oneCase.CaseStatus)
             for caseLayer in featureLayer.caseLayerList:
                 if caseLayer.running == RunningStatus.UnRun and exceptUnRun:
                     continue
-                all_status.allCases += (caseLayer.CaseStatus,)
+                allCases.append(caseLayer.CaseStatus)
+        all_status.runningCases = tuple(runningCases)
+        all_status.allCases = tuple(allCases)
         return all_status
 
     def getAllWillRunCaseLayers(self) -> List[CaseLayer]:
@@ -299,13 +353,16 @@ class ProjectLayer:
         willRunCaseLayers = []
         for featureLayer in self.featureLayers:
             willRunCaseLayers += featureLayer.getWillRunCaseLayers()
-        willRunCaseLayers.sort(key=lambda cb: cb.caseNum)
-        willRunCaseLayers.sort(key=lambda cb: cb.order)
+        # 复合键一次排序等价于先按caseNum再按order的两次稳定排序
+        willRunCaseLayers.sort(key=attrgetter('order', 'caseNum'))
         return willRunCaseLayers
 
     def getCaseLayerByID(self, caseLayerID: int):
-        """根据用例层ID获取用例层对象"""
+        """根据用例层ID获取用例层对象。优先查id索引，未命中再回退遍历兜底"""
         caseLayerID = int(caseLayerID)
+        caseLayer = self.__caseLayerById.get(caseLayerID)
+        if caseLayer is not None:
+            return caseLayer
         if self.setup and self.setup.id == caseLayerID:
             return self.setup
         if self.teardown and self.teardown.id == caseLayerID:
@@ -320,31 +377,73 @@ class ProjectLayer:
                     return caseLayer
         return None
 
+    def _registerCaseLayer(self, caseLayer: CaseLayer):
+        """登记用例层到id索引（由各层添加setup/teardown/用例时回调）"""
+        self.__caseLayerById[caseLayer.id] = caseLayer
+        self._bumpShapeRev()
+
+    def _bumpShapeRev(self):
+        """项目结构修订号递增，使缓存的描述失效（项目级用例状态变更时亦会回调）"""
+        self.__shapeRev += 1
+
+    def _descVersion(self) -> tuple:
+        """描述缓存的版本键：项目自身修订号 + 各功能分类修订号"""
+        return self.__shapeRev, tuple(f._rev for f in self.__featureLayers)
+
+    def _caseRunningChanged(self, started: bool):
+        """用例进入/离开Running状态时维护运行计数（由 CaseLayer._setRunning 回调）"""
+        with self.__runningCountLock:
+            self.__runningCount += 1 if started else -1
+
+    def anyRunning(self) -> bool:
+        """是否有用例正在执行。O(1)读取计数，等待循环可借此跳过整树遍历"""
+        return self.__runningCount > 0
+
+    def _beginRun(self):
+        """运行开始前的一次性准备：遍历清空各功能分类的统计缓存"""
+        for featureLayer in self.featureLayers:
+            featureLayer._clearCountCache()
+
     def run(self):
         """执行该项目的用例，运行后参数会清空
 
         :return: 通过数，不通过数
         """
         ok = no = 0
+        self._beginRun()
         feature = self.arguments.get('feature') if self.runBy == Enums.RunBy_arguments else None
         try:
-            featureNames = [fb.featureName for fb in self.featureLayers]
-            case_run_count = sum([fb.countRunCase() for fb in self.featureLayers])
-            if feature and feature not in featureNames or case_run_count == 0:
+            if feature:  # 名索引O(1)判断筛选是否可能命中，命中时只统计与调度该分类
+                matched = self.__featureByName.get(feature)
+                if matched is None:
+                    return ok, no
+                featureLayers = (matched,)
+            else:
+                featureLayers = self.featureLayers
+            case_run_count = sum(fb.countRunCase() for fb in featureLayers)
+            if case_run_count == 0:
                 return ok, no
             if self.setup is not None:
                 self.dtLog.info('')
-                self.dtLog.info(' Project Setup Start '.center(75, '-'))
+                self.dtLog.info(_PROJECT_SETUP_BANNER)
                 setUpIsPass = self.setup.run()
                 if not setUpIsPass:
                     return ok, no
-            for childFeature in self.featureLayers:
-                _ok, _no = childFeature.run()
-                ok += _ok
-                no += _no
+            if self.parallelFeatures > 1 and len(featureLayers) > 1:
+                with ThreadPoolExecutor(max_workers=min(self.parallelFeatures, len(featureLayers))) as executor:
+                    futures = [executor.submit(childFeature.run) for childFeature in featureLayers]
+                    for future in as_completed(futures):
+                        _ok, _no = future.result()
+                        ok += _ok
+                        no += _no
+            else:
+                for childFeature in featureLayers:
+                    _ok, _no = childFeature.run()
+                    ok += _ok
+                    no += _no
             if self.teardown is not None:
                 self.dtLog.info('')
-                self.dtLog.info(' Project Teardown Start '.center(75, '-'))
+                self.dtLog.info(_PROJECT_TEARDOWN_BANNER)
                 self.teardown.run()
             return ok, no
         except CaseStopExit as err:
@@ -7,22 +7,39 @@
 # ========================================
 from __future__ import annotations
 
+import os
 import threading
 import time
 import traceback
-from pathlib import Path
 from typing import List, Tuple, Union, Optional, Callable, Dict, Any
-from xml.dom import minidom
 from lxml import etree
 
 from .Step import Step
 from .BaseType import *
 
+_UNCHANGED = object()  # 哨兵：_setRunning 调用中表示不修改 isPass
+
+_XML_BRACKET_TR = str.maketrans({'<': '‹', '>': '›'})  # 描述中尖括号转义表，一次扫描完成替换
+
+# 终态集合：步骤进入这些状态后通知所有等待中的层级
+_TERMINAL_STATES = frozenset({RunningStatus.Finished, RunningStatus.Error, RunningStatus.Skipped,
+                              RunningStatus.Timeout, RunningStatus.Canceled, RunningStatus.Killed})
+
 
 class StepLayer:
     """一个管理用例函数中一个步骤的层级对象，储存关于该步骤的一些数据"""
+    # 固定实例属性走slots，降低单实例内存并加速属性访问
+    __slots__ = (
+        '_StepLayer__cachedFull', '_StepLayer__cachedSimple',
+        '_StepLayer__running', '_StepLayer__isPass', '_StepLayer__step',
+        '_StepLayer__locked', '_StepLayer__autoType', '_StepLayer__caseLayer', '_StepLayer__failContinue',
+        '_StepLayer__stepFunc', '_StepLayer__skip', '_StepLayer__timeout', '_StepLayer__frequency',
+        'error',
+    )
     lock = threading.Lock()
     '''步骤的线程锁'''
+    _fallbackCondition = threading.Condition()
+    '''无根项目时使用的状态通知条件变量'''
     def __init__(self, step, stepFunc, caseLayer=None, *, locked=True, skip=False, timeout=0, frequency=15,
                  autoType='auto', failContinue=False):
         """加载步骤函数为抽象层级对象
@@ -37,6 +54,8 @@ class StepLayer:
         :param str autoType: 自动化类型（no-auto:非自动，half-auto:半自动，auto:全自动）
         :param bool failContinue: 失败是否继续执行，默认否。当设置True时，失败将返回StepFailContinue这个错误
         """
+        self.__cachedFull = None  # 缓存的完整描述字符串，状态变更时失效
+        self.__cachedSimple = None  # 缓存的简单描述字符串，状态变更时失效
         self.__running = RunningStatus.UnRun
         self.__isPass = None
         self.__step = step if isinstance(step, Step) else Step(step, parseFromMsg=True)
@@ -50,7 +69,7 @@ class StepLayer:
         self.skip = skip
         self.timeout = timeout
         self.frequency = frequency
-        if caseLayer and self not in self.caseLayer.steps:
+        if caseLayer and not self.caseLayer._containsStep(self):
             self.caseLayer.addStepLayer(self)
 
     def __str__(self): return self.descriptionFull
@@ -58,7 +77,13 @@ class StepLayer:
 
     @property
     def descriptionFull(self):
-        """完整自我描述"""
+        """完整自我描述（按状态缓存，状态未变时直接返回缓存字符串）"""
+        if self.__cachedFull is None:
+            self.__cachedFull = etree.tostring(self._descriptionFullElement(), pretty_print=True, encoding='unicode')
+        return self.__cachedFull
+
+    def _descriptionFullElement(self) -> etree._Element:
+        """构建完整自我描述的 _Element 树，供上层直接拼接、不经字符串往返"""
         root = etree.Element('StepLayer')  # 根节点
         etree.SubElement(root, 'id', attrib={'value': str(id(self))})
         etree.SubElement(root, 'caseNum', attrib={'value': str(self.caseNum)})
@@ -66,17 +91,44 @@ class StepLayer:
         etree.SubElement(root, 'running', attrib={'value': str(self.running.name)})
         etree.SubElement(root, 'isPass', attrib={'value': str(self.isPass)})
         etree.SubElement(root, 'locked', attrib={'value': str(self.locked)})
-        etree.SubElement(root, 'stepFunc', attrib={'value': str(self.stepFunc).replace('<', '‹').replace('>', '›')})
-        etree.SubElement(root, 'description', attrib={'value': str(self.step.description).replace('<', '‹').replace('>', '›')})
-        tree = etree.ElementTree(root)
-        xml_str = minidom.parseString(etree.tostring(tree.getroot())).toprettyxml()
-        xml_str: str = xml_str.replace('<?xml version="1.0" ?>', '')
-        return xml_str
+        etree.SubElement(root, 'stepFunc', attrib={'value': str(self.stepFunc).translate(_XML_BRACKET_TR)})
+        etree.SubElement(root, 'description', attrib={'value': str(self.step.description).translate(_XML_BRACKET_TR)})
+        return root
 
     @property
     def descriptionSimple(self):
-        """简单自我描述"""
-        return f'<StepLayer id="{id(self)}" caseNum="{self.caseNum}" stepName="{self.stepName}" locked="{self.locked}"/>'
+        """简单自我描述（按状态缓存）"""
+        if self.__cachedSimple is None:
+            self.__cachedSimple = f'<StepLayer id="{id(self)}" caseNum="{self.caseNum}" stepName="{self.stepName}" locked="{self.locked}"/>'
+        return self.__cachedSimple
+
+    def _invalidateDescription(self):
+        """令缓存的描述字符串失效"""
+        self.__cachedFull = self.__cachedSimple = None
+
+    def _setRunning(self, running: RunningStatus, isPass=_UNCHANGED):
+        """集中修改运行/通过状态，同时令缓存的描述失效；到达终态时唤醒等待中的层级"""
+        self.__running = running
+        if isPass is not _UNCHANGED:
+            self.__isPass = isPass
+        self.__cachedFull = self.__cachedSimple = None
+        caseLayer = self.__caseLayer
+        if caseLayer is not None:  # 维护所属用例的"当前运行步骤"槽位，供getRunningStep O(1)读取
+            if running == RunningStatus.Running:
+                caseLayer._setRunningStep(self)
+            elif caseLayer.getRunningStep() is self:
+                caseLayer._setRunningStep(None)
+        if running in _TERMINAL_STATES:
+            condition = self._stateCondition()
+            with condition:
+                condition.notify_all()
+
+    def _stateCondition(self) -> threading.Condition:
+        """状态变更通知的条件变量：优先取所属项目的，无根项目时退回类级共享的"""
+        try:
+            return self.caseLayer.projectLayer._stateCondition
+        except AttributeError:
+            return StepLayer._fallbackCondition
 
     @property
     def id(self): return id(self)
@@ -108,9 +160,10 @@ class StepLayer:
     @stepFunc.setter
     def stepFunc(self, stepFunc: Callable):
         """设置步骤函数对象"""
-        if not isinstance(stepFunc, Callable):
+        if not callable(stepFunc):
             raise TypeError('`stepFunc`必须为可调用对象！')
         self.__stepFunc = stepFunc
+        self._invalidateDescription()
 
     @property
     def skip(self): return self.__skip
@@ -121,6 +174,7 @@ class StepLayer:
         if not isinstance(skip, bool):
             raise ValueError('"skip" must be bool!')
         self.__skip = skip
+        self._invalidateDescription()
 
     @property
     def timeout(self): return self.__timeout  # 检查其他步骤状态超时时间
@@ -153,7 +207,8 @@ class StepLayer:
         if not isinstance(caseLayer, CaseLayer):
             raise TypeError(f'caseLayer 必须为 CaseLayer！输入值：{caseLayer}')
         self.__caseLayer = caseLayer
-        if self not in caseLayer.steps:
+        self._invalidateDescription()
+        if not caseLayer._containsStep(self):
             caseLayer.addStepLayer(self)
 
     def withStep(self, logger=None):
@@ -186,48 +241,47 @@ class StepLayer:
         if not self.locked:  # 1. 若本步骤不锁定：执行本步骤
             return True
         # 2. 若本步骤锁定：-> 读取当前运行的步骤
-        runningCases = runningCases or self.caseLayer.projectLayer.getRunningCaseLayers()
-        runningStepLayers = [case.getRunningStep() for case in runningCases if case.getRunningStep() is not None]
-        if not runningStepLayers:  # 2.1 若无其他运行步骤：执行本步骤
-            return True
-        # 2.2 若有其他运行步骤 -> 遍历其他步骤是否锁定。 只有其他步骤全部不锁定才判断将执行。
-        for step in runningStepLayers:
-            if step.locked:  # 2.2.1 若其他步骤锁定：继续等待
-                return False
-        return True  # 2.2.2 若其他步骤不锁定：执行本步骤
+        runningCases = runningCases or self.caseLayer.projectLayer.iterRunningCaseLayers()
+        # 2.1/2.2 单遍惰性遍历：任一运行步骤锁定则继续等待，否则（含无运行步骤）执行本步骤
+        return not any(step.locked for step in (case.getRunningStep() for case in runningCases)
+                       if step is not None)
 
     def runStep(self, *args, **kwargs) -> Union[Any, StepFailContinue]:
         """执行该步骤，返回原结果"""
         # 将要执行，预先判断其他步骤运行情况
         # timeout: -1 永远，0 仅一次，>0 超时时间，秒
-        self.__running = RunningStatus.UnRun
-        self.__isPass = None
+        self._setRunning(RunningStatus.UnRun, None)
         # 首先，判断是否应该执行
         if self.skip:
-            self.__running = RunningStatus.Skipped
+            self._setRunning(RunningStatus.Skipped)
             raise SkippedError(f'已跳过步骤：{self.step}')
 
         # 即将执行，预先判断其他步骤运行状态
-        self.__running = RunningStatus.Waiting
+        self._setRunning(RunningStatus.Waiting)
         if self.timeout == 0:
             if not self.willRun():
-                self.__running = RunningStatus.Timeout
+                self._setRunning(RunningStatus.Timeout)
                 msg = f'步骤执行失败，存在其他执行中的步骤！本用例：{self.caseNum}，步骤：{self.stepName}'
                 self.toLog.error(msg)
                 raise ExecuteClashError(msg)
         else:
-            willRun = False
             start = time.time()
+            condition = self._stateCondition()
+            with condition:
+                while True:
+                    willRun = self.willRun()
+                    if willRun:
+                        break
+                    usetime = time.time() - start
+                    if self.timeout != -1 and usetime >= self.timeout:
+                        break
+                    self.toLog.info(f'步骤：{self.caseNum}-{self.stepName} 等待其他执行中的步骤执行完毕... 最长等待间隔：{self.frequency}s')
+                    # 其他步骤/用例到达终态时立即被唤醒；frequency 仅作为兜底的最长唤醒间隔
+                    wait = self.frequency if self.timeout == -1 else min(self.frequency, self.timeout - usetime)
+                    condition.wait(wait)
             usetime = time.time() - start
-            while usetime < self.timeout or self.timeout == -1:
-                willRun = self.willRun()
-                if willRun:
-                    break
-                self.toLog.info(f'步骤：{self.caseNum}-{self.stepName} 等待其他执行中的步骤执行完毕... 等待间隔：{self.frequency}s')
-                time.sleep(self.frequency)
-                usetime = time.time() - start
             if not willRun:
-                self.__running = RunningStatus.Timeout
+                self._setRunning(RunningStatus.Timeout)
                 msg = f'步骤执行失败，等待其他执行中的步骤执行完毕超时！步骤：{self.caseNum}-{self.stepName}，等待总时长：{usetime}s'
                 self.toLog.error(msg)
                 raise ExecuteTimeoutError(msg)
@@ -237,29 +291,38 @@ class StepLayer:
         # 开始执行
         def main_runStep():
             """执行步骤"""
-            self.__running = RunningStatus.Running
+            self._setRunning(RunningStatus.Running)
             self.toLog.info(f'\t\t-> *执行步骤*：{self.stepName}（用例：{self.caseNum}）')
             try:
                 result = self.stepFunc(*args, **kwargs)
             except Exception as err:
-                err_msg = f'{err.__class__.__name__}: {err}\nAt: \n{traceback.format_exc().replace(str(Path.cwd()), "")}'
+                err_msg = f'{err.__class__.__name__}: {err}\nAt: \n{traceback.format_exc().replace(os.getcwd(), "")}'
                 self.error = err_msg
                 self.toLog.error(f'异常错误：{err_msg}')
-                self.__running = RunningStatus.Error
-                self.__isPass = False
+                self._setRunning(RunningStatus.Error, False)
                 if not self.__failContinue:
                     raise
                 self.caseLayer.error_count += 1
                 return StepFailContinue(err)
             else:
-                self.__running = RunningStatus.Finished
-                self.__isPass = True
+                self._setRunning(RunningStatus.Finished, True)
                 return result
 
         if not self.locked:  # 闲置步骤则不需要线程锁
             return main_runStep()
-        with StepLayer.lock:
+        with self._runLock():
             return main_runStep()
 
+    def _runLock(self) -> threading.Lock:
+        """锁定步骤执行用的互斥锁：优先取所属项目的步骤锁（锁粒度到项目），无根项目时退回类级锁
+
+        注意：锁必须覆盖整个步骤体——锁定步骤的语义是独占执行，
+        提前释放会让两个锁定步骤在 willRun 判断间隙同时进入执行。
+        """
+        try:
+            return self.caseLayer.projectLayer.stepLock
+        except AttributeError:
+            return StepLayer.lock
+
 
 from .CaseLayer import CaseLayer
\ No newline at end of file